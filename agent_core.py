@@ -1,18 +1,6 @@
 import os
-from strands import Agent
 from dotenv import load_dotenv
 
-from agent_tools import (
-    semantic_search,
-    get_document_names,
-    get_full_document,
-    get_document_page,
-    create_document,
-    get_created_documents,
-    read_created_document,
-    convert_markdown_document,
-)
-
 load_dotenv(".env")
 
 PROMPT_PATH = os.getenv(
@@ -25,24 +13,69 @@ with open(PROMPT_PATH, "r", encoding="utf-8") as f:
 
 MODEL_ID = os.getenv("LLM_MODEL_ID")  
 
-def build_agent():
+def build_agent(max_messages=None):
+    """
+    Build a new agent. With max_messages, only that many of the most recent conversation messages are kept.
+    """
+    # strands and the tools are imported here, so importing this module stays fast
+    from strands import Agent
+    from strands.agent.conversation_manager import SlidingWindowConversationManager
+    from agent_tools import (
+        ParallelSafeToolExecutor,
+        semantic_search,
+        semantic_search_batch,
+        expand_search_result,
+        get_document_names,
+        get_document_catalog,
+        get_full_document,
+        get_document_page,
+        get_document_pages,
+        create_document,
+        get_created_documents,
+        read_created_document,
+        convert_markdown_document,
+    )
     kwargs = {
         "system_prompt": PROMPT,
         "tools": [
             semantic_search,
+            semantic_search_batch,
+            expand_search_result,
             get_document_names,
+            get_document_catalog,
             get_full_document,
             get_document_page,
+            get_document_pages,
             create_document,
             get_created_documents,
             read_created_document,
             convert_markdown_document,
         ],
-        "model": MODEL_ID
+        "model": MODEL_ID,
+        # read-only tool calls from one model turn run together, the others in order, see parallel_safe in agent_tools
+        "tool_executor": ParallelSafeToolExecutor(),
     }
+    if max_messages:
+        # trims whole turns, so a tool result is never kept without its tool call
+        kwargs["conversation_manager"] = SlidingWindowConversationManager(window_size=max_messages)
     return Agent(**kwargs)
 
-agent = build_agent()
+_agent = None
+
+def get_agent():
+    """
+    Get the shared agent, building it on first use.
+    """
+    global _agent
+    if _agent is None:
+        _agent = build_agent()
+    return _agent
+
+def __getattr__(name):
+    # keeps `from agent_core import agent` working, the agent is only built when it is first imported this way
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__} has no attribute {name}")
 
 if __name__ == "__main__":
-    print(agent("Tell me about yourself"))
+    print(get_agent()("Tell me about yourself"))
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+'''
+Pool of agents for serving several users from one process. Every session gets its own agent, so conversations
+never mix, created on first use and dropped after being idle for a while. At most max_concurrent agents run
+at once; further requests wait in a first-come, first-served queue and can show their position in it.
+'''
+
+AGENT_MAX_CONCURRENT = int(os.getenv("AGENT_MAX_CONCURRENT", 4)) # agent runs at the same time, across all sessions
+AGENT_IDLE_TIMEOUT = float(os.getenv("AGENT_IDLE_TIMEOUT", 1800)) # seconds before an idle session's agent is dropped
+AGENT_MAX_MESSAGES = int(os.getenv("AGENT_MAX_MESSAGES", 40)) # conversation history kept per session
+
+class AgentPool:
+    def __init__(self, build, max_concurrent=AGENT_MAX_CONCURRENT, idle_timeout=AGENT_IDLE_TIMEOUT):
+        self.build = build # function returning a new agent
+        self.max_concurrent = max_concurrent
+        self.idle_timeout = idle_timeout
+        self._agents = {} # session id -> (agent, time last used)
+        self._busy = set() # sessions whose agent is running
+        self._queue = deque() # session ids waiting for a slot, in order
+        self._condition = threading.Condition()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for session_id, (_, last_used) in list(self._agents.items()):
+            if session_id not in self._busy and now - last_used > self.idle_timeout:
+                del self._agents[session_id]
+
+    def _agent(self, session_id):
+        if session_id not in self._agents:
+            self._agents[session_id] = (self.build(), time.monotonic())
+        return self._agents[session_id][0]
+
+    def _can_run(self, ticket):
+        # tickets of sessions that are already running don't hold up the ones behind them
+        session_id = ticket[0]
+        if len(self._busy) >= self.max_concurrent or session_id in self._busy:
+            return False
+        for waiting in self._queue:
+            if waiting is ticket:
+                return True
+            if waiting[0] not in self._busy:
+                return False
+
+    @contextmanager
+    def session(self, session_id, on_wait=None):
+        """
+        Wait for a free slot and yield the session's agent. While waiting, on_wait(position) is called
+        whenever the position in the queue changes (1 = next). A session only runs one request at a time.
+        """
+        ticket = (session_id, object())
+        position = None
+        with self._condition:
+            self._queue.append(ticket)
+            while not self._can_run(ticket):
+                new_position = self._queue.index(ticket) + 1
+                if on_wait and new_position != position:
+                    on_wait(new_position)
+                position = new_position
+                self._condition.wait(timeout=1)
+            self._queue.remove(ticket)
+            self._busy.add(session_id)
+            self._evict_idle()
+            agent = self._agent(session_id) # built under the lock, so one session never gets two agents
+            self._condition.notify_all() # the next ticket may be able to run too
+        try:
+            yield agent
+        finally:
+            with self._condition:
+                self._busy.discard(session_id)
+                if session_id in self._agents:
+                    self._agents[session_id] = (agent, time.monotonic())
+                self._condition.notify_all()
+
+    def reset(self, session_id):
+        """
+        Forget a session's agent and its conversation.
+        """
+        with self._condition:
+            if session_id not in self._busy:
+                self._agents.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"sessions": len(self._agents), "running": len(self._busy), "waiting": len(self._queue)}
@@ -1,13 +1,60 @@
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Union
 
-from vector import *  # provides DOCUMENT_FOLDER, query_content, extract_pdf
-import spire.doc
-import markdown_pdf
+from doc_service import *  # provides DOCUMENT_FOLDER, query_content, query_content_many, served by the document service
+from document_reader import read_stored_document, MAX_CHARS
+from vector import search_filters # builds the filters, the searches themselves go through the document service
+from converters import convert_markdown, document_lock
 
 from strands import tool
+from strands.tools.executors import ConcurrentToolExecutor, SequentialToolExecutor
+
+# read-only tools requested in the same model turn run at the same time, in this pool
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", 4))
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+PARALLEL_SAFE = set() # names of the tools marked with parallel_safe
+
+def parallel_safe(function):
+    """
+    Mark a read-only tool as safe to run alongside other tool calls, see ParallelSafeToolExecutor. The tool runs in tool_pool,
+    so the agent can await several of them at once.
+    """
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(tool_pool, functools.partial(function, *args, **kwargs))
+    PARALLEL_SAFE.add(function.__name__)
+    return wrapper
+
+class ParallelSafeToolExecutor(SequentialToolExecutor):
+    """
+    Runs the tool calls of one model turn in the order they were made, except that consecutive calls to
+    parallel_safe tools run at the same time. A write, like creating a document and then converting it,
+    never overtakes an earlier call.
+    """
+    def __init__(self):
+        super().__init__()
+        self._concurrent = ConcurrentToolExecutor()
+
+    async def _execute(self, agent, tool_uses, *args, **kwargs):
+        batch = [] # consecutive parallel_safe calls, run together
+        for tool_use in [*tool_uses, None]:
+            if tool_use is not None and tool_use["name"] in PARALLEL_SAFE:
+                batch.append(tool_use)
+                continue
+            if batch:
+                async for event in self._concurrent._execute(agent, batch, *args, **kwargs):
+                    yield event
+                batch = []
+            if tool_use is not None:
+                async for event in super()._execute(agent, [tool_use], *args, **kwargs):
+                    yield event
 
 @tool
+@parallel_safe
 def get_document_names():
     """
     Get the names of all stored documents.
@@ -18,46 +65,119 @@ def get_document_names():
     return names
 
 @tool
-def get_full_document(document_name: str):
+@parallel_safe
+def get_document_catalog():
+    """
+    Get an overview of every stored document in one call: its name, number of pages, section outline, key terms,
+    and lead section (usually the abstract). Use this to find which documents cover a topic before reading any of them.
+    Returns:
+        list: One profile per document, with document, pages, chars, outline (section titles and their pages), key_terms, lead, tags and stored_at.
+    """
+    return document_catalog()
+
+@tool
+@parallel_safe
+def get_full_document(document_name: str, cursor: str = "chars:0-", max_chars: int = MAX_CHARS):
     """
-    Get the full text of a document by its name. Call get_document_names() to input the exact name.
+    Get the text of a document by its name, at most max_chars characters at a time. Call get_document_names() to input the exact name.
+    If the document is longer, call again with cursor set to the returned next_cursor to continue reading.
+    Prefer semantic_search() or get_document_pages() when only parts of the document are needed.
     Args:
         str: The document name from get_document_names() list.
+        str: Where to start reading, the next_cursor of the previous call. Defaults to the start of the document.
+        int: The most characters to return.
     Returns:
-        str|list: The full text of the document if the document is a txt. If it is a pdf, a list of strings, each representing a page.
+        dict: The document name, its number of pages and the range read, with its text and next_cursor (null once the end is reached).
     """
-    if document_name.endswith('.txt'):
-        with open(f"{DOCUMENT_FOLDER}/{document_name}", 'r') as f:
-            return f.read()
-    elif document_name.endswith('.pdf'):
-        return extract_pdf(f"{DOCUMENT_FOLDER}/{document_name}")
+    return read_stored_document(document_name, [cursor], max_chars)
 
 @tool
-def get_document_page(document_name: str, page_number: int):
+@parallel_safe
+def get_document_page(document_name: str, page_number: int, max_chars: int = MAX_CHARS):
     """
     Get a specific page of a document by its name. Call get_document_names() to input the exact name.
+    Text documents are split into pages of a few thousand characters.
     Args:
         str: The document name from get_document_names() list.
         int: The page number to retrieve (1-indexed).
+        int: The most characters to return.
     Returns:
-        str|list: The full text of the document if the document is a txt. If it is a pdf, a list of strings, each representing a page.
+        dict: The document name, its number of pages and the page, with its text and next_cursor if it was cut off.
     """
-    if document_name.endswith('.txt'):
-        with open(f"{DOCUMENT_FOLDER}/{document_name}", 'r') as f:
-            return f.read()
-    elif document_name.endswith('.pdf'):
-        return extract_pdf(f"{DOCUMENT_FOLDER}/{document_name}")[page_number-1]
+    return read_stored_document(document_name, [str(page_number)], max_chars)
 
 @tool
-def semantic_search(query):
+@parallel_safe
+def get_document_pages(document_name: str, ranges: list, max_chars: int = MAX_CHARS):
+    """
+    Get several parts of a document in one call. Call get_document_names() to input the exact name.
+    Each range is a page "3", pages "2-4", characters "chars:0-5000", tokens "tokens:0-1000", or a next_cursor from an earlier call.
+    Pages are 1-indexed, text documents are split into pages of a few thousand characters.
+    Args:
+        str: The document name from get_document_names() list.
+        list: The ranges to read, in order.
+        int: The most characters to return, shared by all ranges.
+    Returns:
+        dict: The document name, its number of pages and one entry per range with its text and next_cursor, set when the range did not fit.
+    """
+    return read_stored_document(document_name, ranges, max_chars)
+
+@tool
+@parallel_safe
+def semantic_search(query, sources: list = None, pages: list = None, tags: list = None, stored_after: str = None, stored_before: str = None,
+                    shards: list = None):
     """
     Semantically search for relevant sections of the stored documents based on the query.
+    Sections that contain the exact terms of the query, such as paper names, acronyms or symbols, are also found.
+    The optional filters narrow the search, for example to the documents a question is about.
     Args:
         str: A search query.
+        list: Only search these documents, names from get_document_names().
+        list: Only search these pages, [first, last], numbered like the Page of the results.
+        list: Only search documents with any of these tags, see get_document_catalog().
+        str: Only search documents stored on or after this date, e.g. 2025-03-01.
+        str: Only search documents stored before this date.
+        list: Only search these document groups, the shard of each document in get_document_catalog().
+    Returns:
+        list: Containing sections and metadata regarding its Id, Source, Page, Chunk, and Distance.
+    """
+    return query_content(query, filters=search_filters(sources, pages, tags, stored_after, stored_before, shards))
+
+@tool
+@parallel_safe
+def semantic_search_batch(queries: list, deduplicate: bool = True, sources: list = None, pages: list = None, tags: list = None,
+                          stored_after: str = None, stored_before: str = None, shards: list = None):
+    """
+    Semantically search for several queries in one call. Use this instead of calling semantic_search() repeatedly,
+    for example to look up each part of a multi-part question. The filters are the same as for semantic_search() and apply to every query.
+    Args:
+        list: A list of search queries.
+        bool: Leave out sections already returned for an earlier query in the list. Defaults to True.
+        list: Only search these documents.
+        list: Only search these pages, [first, last].
+        list: Only search documents with any of these tags.
+        str: Only search documents stored on or after this date.
+        str: Only search documents stored before this date.
+        list: Only search these document groups.
     Returns:
-        list: Containing sections and metadata regarding its Source, Page, Chunk, and Distance.
+        list: One entry per query, with the Query and its Results, each containing a section and metadata regarding its Id, Source, Page, Chunk, and Distance.
     """
-    return query_content(query)
+    return query_content_many(queries, deduplicate=deduplicate, filters=search_filters(sources, pages, tags, stored_after, stored_before, shards))
+
+@tool
+@parallel_safe
+def expand_search_result(chunk_id: str, before: int = 1, after: int = 1):
+    """
+    Get more context around a section found by semantic_search(): the sections just before and after it in the same document.
+    Much cheaper than reading the whole document.
+    Args:
+        str: The Id of a search result.
+        int: How many sections before it to include. Defaults to 1.
+        int: How many sections after it to include. Defaults to 1.
+    Returns:
+        dict: The Source, the Pages covered, the Ids of the sections and their merged Content.
+    """
+    return expand_hit(chunk_id, before, after) or f"No section with Id {chunk_id}, it may have been re-indexed. Search again."
 
 @tool
 def create_document(document_name, markdown_string):
@@ -73,11 +193,12 @@ def create_document(document_name, markdown_string):
     if not document_name.endswith('.md'):
         document_name += '.md'
     filename = f"created_documents/{document_name}"
-    with open(filename, 'w') as f:
+    with document_lock(document_name), open(filename, 'w') as f:
         f.write(markdown_string)
     return os.path.abspath(filename)
 
 @tool
+@parallel_safe
 def get_created_documents():
     """
     Get a list of names of all created markdown documents.
@@ -85,6 +206,7 @@ def get_created_documents():
     return [f for f in os.listdir("created_documents") if f.endswith('.md')]
 
 @tool
+@parallel_safe
 def read_created_document(document_name: str):
     """
     Get the content of a created markdown document.
@@ -111,17 +233,5 @@ def convert_markdown_document(document_name, document_type):
     Returns:
         str: The absolute path to the converted document.
     """
-    if not os.path.exists(f"created_documents/{document_name}"):
-        return f"No documents named {document_name}. Use get_created_documents() to find the exact name."
-    if document_type == "pdf":
-        pdf = markdown_pdf.MarkdownPdf()
-        with open(f"created_documents/{document_name}", 'r') as f:
-            pdf.add_section(markdown_pdf.Section(f.read()))
-        pdf.save(f"created_documents/{document_name}.pdf")
-    elif document_type == "docx":
-        document = spire.doc.Document()
-        document.LoadFromFile(f"created_documents/{document_name}", spire.doc.FileFormat.Markdown)
-        document.SaveToFile(f"created_documents/{document_name}.docx", spire.doc.FileFormat.Docx2016)
-    else:
-        return "Unknown type of document, only supports pdf or docx."
-    return os.path.abspath(f"created_documents/{document_name}.{document_type}")
+    with document_lock(document_name):
+        return convert_markdown(document_name, document_type)
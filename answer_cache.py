@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+import numpy as np
+
+'''
+Semantic cache for LLM answers. A question whose embedding is close enough to a question answered before,
+asked with the same prompt against the same corpus version, gets the earlier answer instead of a new LLM call.
+Storing or deleting documents bumps the corpus version, which invalidates every cached answer.
+'''
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)) # cosine similarity needed for a hit
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 200)) # answers kept before the least recently used one is evicted
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600)) # seconds an answer stays valid
+
+def prompt_hash(prompt:str) -> str:
+    return sha256(prompt.encode()).hexdigest()
+
+class AnswerCache:
+    def __init__(self, embed, threshold=ANSWER_CACHE_THRESHOLD, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.embed = embed # function taking a list of texts and returning their embeddings
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # query -> (unit embedding, prompt hash, corpus version, time stored, answer)
+        self._lock = threading.Lock()
+
+    def _embedding(self, query):
+        embedding = np.asarray(self.embed([query])[0], dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def lookup(self, query:str, prompt_hash:str, version):
+        """
+        Get (cached answer, the question it answered) for the most similar cached question, or None if there is none close enough.
+        """
+        embedding = self._embedding(query)
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[2] != version or now - entry[3] > self.ttl]:
+                del self._entries[key] # answered against an older corpus, or expired
+            best, best_similarity = None, self.threshold
+            for key, (cached_embedding, cached_prompt, _, _, _) in self._entries.items():
+                if cached_prompt != prompt_hash:
+                    continue
+                similarity = float(np.dot(cached_embedding, embedding))
+                if similarity >= best_similarity:
+                    best, best_similarity = key, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            return self._entries[best][4], best
+
+    def store(self, query:str, prompt_hash:str, version, answer):
+        embedding = self._embedding(query)
+        with self._lock:
+            self._entries[query] = (embedding, prompt_hash, version, time.monotonic(), answer)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0, "size": len(self._entries)}
@@ -3,7 +3,8 @@ import streamlit as st
 from dotenv import load_dotenv
 import boto3
 
-from vector import store_content, query_content, DOCUMENT_FOLDER, delete_all_vectors
+from doc_service import store_content, query_content, DOCUMENT_FOLDER, delete_all_vectors, remove_document, replace_document, set_document_tags, embed_queries, corpus_version
+from answer_cache import AnswerCache, prompt_hash
 # ---------- config ----------------- 
 load_dotenv()  #aws_credentials put in .env file
 LLM_MODEL = os.getenv("BEDROCK_LLM_MODEL")
@@ -15,7 +16,7 @@ def ingest_pdf(file_bytes: bytes, filename: str):
     call dimas function to store document, if user want to add on documents
     """
     os.makedirs(DOCUMENT_FOLDER, exist_ok=True)
-    saved_path = os.path.join(DOCUMENT_FOLDER, filename)
+    saved_path = f"{DOCUMENT_FOLDER}/{filename}" # same form as the names stored by vector.py
     with open(saved_path, "wb") as f:
         f.write(file_bytes)
 
@@ -124,12 +125,28 @@ def bedrock_generate(prompt: str, max_tokens=1100):
     pieces = data["output"]["message"]["content"]
     return "".join([p.get("text","") for p in pieces])
 
+@st.cache_resource
+def get_answer_cache():
+    """
+    One answer cache for the whole Streamlit process, shared by all sessions.
+    """
+    return AnswerCache(embed_queries)
+
 def route_and_answer(query: str, debug: bool = False):
     """
     From user query: 
         if debug mode will format the search data
         if rag mode will check sim score first
+    Answers to the same or a similar question, against the same documents, are reused from the answer cache.
     """
+    version = corpus_version()
+    prompt_key = prompt_hash(f"{LLM_MODEL}\n{rag_prompt('', [])}\n{open_prompt('')}") # changes whenever the prompts do
+    if not debug:
+        cached = get_answer_cache().lookup(query, prompt_key, version)
+        if cached:
+            answer, cached_query = cached
+            return {**answer, "search_result": "CACHE", "cached_query": cached_query}
+
     hits_list, stats = search(query, k=5)
     sim_mean = stats["sim_mean"]
     is_background = any(w in query.lower() for w in ["what is", "explain", "overview", "definition"])
@@ -157,6 +174,7 @@ def route_and_answer(query: str, debug: bool = False):
         except Exception:
             data = {"mode":"RAG","answer":raw}
         data["stats"] = stats
+        get_answer_cache().store(query, prompt_key, version, data)
         return data
 
     if is_background:
@@ -166,6 +184,7 @@ def route_and_answer(query: str, debug: bool = False):
         except Exception:
             data = {"mode":"OPEN","answer":raw,"disclaimer":"Not grounded."}
         data["stats"] = stats
+        get_answer_cache().store(query, prompt_key, version, data)
         return data
 
     return {"mode":"ABSTAIN","reason":"No sufficient evidence found in your local library.","stats":stats}
@@ -242,6 +261,29 @@ with st.sidebar:
                 if st.button(f"📄 {fn}", key=fn):
                     os.startfile(os.path.abspath(f"{DOCUMENT_FOLDER}/{fn}"))
 
+    st.header("Manage Papers")
+    papers = sorted(fn for fn in os.listdir(DOCUMENT_FOLDER) if fn.lower().endswith(('.txt', '.pdf')))
+    if not papers:
+        st.info("No papers to manage!")
+    else:
+        selected = st.selectbox("Paper", papers)
+        col_reindex, col_remove = st.columns(2)
+        if col_reindex.button("Re-index"):
+            with st.spinner("Re-indexing..."):
+                n = replace_document(selected)
+            st.success(f"Re-indexed `{selected}` with {n} chunks")
+        if col_remove.button("Remove"):
+            n = remove_document(selected, delete_file=True)
+            st.toast(f"Removed `{selected}` and its {n} chunks")
+            st.rerun()
+        tags = st.text_input("Tags (comma separated)", key=f"tags_{selected}")
+        if st.button("Save tags"):
+            try:
+                saved = set_document_tags(selected, tags.split(","))
+                st.success(f"Tagged `{selected}`: {', '.join(saved) or 'no tags'}")
+            except ValueError as e: # not ingested yet
+                st.error(str(e))
+
     st.header("Created Documents")
     if not os.listdir('created_documents'):
         st.info("No created docs yet!")
@@ -299,6 +341,8 @@ for q, res in reversed(st.session_state.history):
     st.markdown(f"**Mode:** {badge.get(res.get('mode','?'))}")
     stats = res.get("stats", {})
     st.caption(f"sim_mean={stats.get('sim_mean',0):.3f}")
+    if res.get("search_result") == "CACHE":
+        st.caption(f"⚡ Cached answer to a similar question: “{res.get('cached_query', '')}”")
 
 #---Populate base on what the LLM return------------------
     if res.get("mode") == "RAG":
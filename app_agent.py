@@ -1,8 +1,12 @@
-import os, json
+import os, json, asyncio, uuid
 import streamlit as st
 
-from vector import store_content, DOCUMENT_FOLDER, delete_all_vectors
-from agent_core import agent  # Strands Agent instance created in here
+from doc_service import store_content, DOCUMENT_FOLDER, delete_all_vectors, remove_document, replace_document, set_document_tags, embed_queries, corpus_version
+from agent_core import build_agent, PROMPT, MODEL_ID  # Strands Agents are created from here, one per session
+from agent_pool import AgentPool, AGENT_MAX_MESSAGES
+from answer_cache import AnswerCache, prompt_hash
+
+PROMPT_HASH = prompt_hash(f"{MODEL_ID}\n{PROMPT}") # cached answers are only reused with the same model and system prompt
 
 # ---------- helpers ----------
 def ingest_pdf(file_bytes: bytes, filename: str):
@@ -10,7 +14,7 @@ def ingest_pdf(file_bytes: bytes, filename: str):
     call dimas function to store document, if user want to add on documents
     """
     os.makedirs(DOCUMENT_FOLDER, exist_ok=True)
-    saved_path = os.path.join(DOCUMENT_FOLDER, filename)
+    saved_path = f"{DOCUMENT_FOLDER}/{filename}" # same form as the names stored by vector.py
     with open(saved_path, "wb") as f:
         f.write(file_bytes)
 
@@ -57,6 +61,98 @@ def markdown_window():
         if st.button("Open in Text Editor"):
             os.startfile(os.path.abspath(f"{DOCUMENT_FOLDER}/{title}"))
 
+@st.cache_resource
+def get_answer_cache():
+    """
+    One answer cache for the whole Streamlit process, shared by all sessions.
+    """
+    return AnswerCache(embed_queries)
+
+@st.cache_resource
+def get_agent_pool():
+    """
+    One pool of agents for the whole Streamlit process, each session gets its own agent from it.
+    """
+    return AgentPool(lambda: build_agent(max_messages=AGENT_MAX_MESSAGES))
+
+def show_queue_position(box):
+    def on_wait(position):
+        box.info(f"⏳ All agents are busy, you are number {position} in the queue...")
+    return on_wait
+
+def partial_answer(text: str):
+    """
+    Pull the "answer" string out of the agent's JSON while it is still streaming, so it can be shown before the JSON is complete.
+    """
+    start = text.find('"answer"')
+    if start == -1:
+        return ""
+    start = text.find('"', text.find(':', start) + 1)
+    if start == -1:
+        return ""
+    escapes = {"n": "\n", "t": "\t", '"': '"', "\\": "\\", "/": "/"}
+    answer = []
+    i = start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            if i + 1 == len(text): # rest of the escape hasn't arrived yet
+                break
+            answer.append(escapes.get(text[i+1], text[i+1]))
+            i += 2
+            continue
+        if text[i] == '"': # end of the answer
+            break
+        answer.append(text[i])
+        i += 1
+    return "".join(answer)
+
+def parse_result(raw: str, tools_seen: list):
+    """
+    Parse the agent's final JSON. Falls back to showing the raw text as the model's answer if it isn't valid JSON.
+    """
+    try:
+        result = json.loads(raw)
+    except json.JSONDecodeError:
+        result = {"answer": raw, "search_result": "MODEL"}
+    if not result.get("tool_used") and tools_seen:
+        result["tool_used"] = tools_seen
+    return result
+
+def remember_cached_answer(agent, query: str, answer: dict):
+    """
+    Add a question answered from the cache, and its answer, to the agent's conversation, so follow-up questions can refer to it.
+    """
+    agent.messages.append({"role": "user", "content": [{"text": query}]})
+    agent.messages.append({"role": "assistant", "content": [{"text": json.dumps(answer)}]})
+
+def run_agent_streaming(agent, query: str, status, answer_box):
+    """
+    Run the agent with its streaming interface, showing tool calls in status and the answer in answer_box as they arrive.
+    Returns the parsed final JSON.
+    """
+    async def consume():
+        text = ""
+        tools_seen = []
+        tool_ids = set()
+        final = None
+        async for event in agent.stream_async(query):
+            tool = event.get("current_tool_use")
+            if tool and tool.get("toolUseId") and tool["toolUseId"] not in tool_ids:
+                tool_ids.add(tool["toolUseId"])
+                tools_seen.append(tool.get("name", "?"))
+                status.write(f"🔧 Calling `{tool.get('name', '?')}`...")
+                text = "" # a new model turn starts after the tool call
+            if "data" in event:
+                text += event["data"]
+                answer_box.markdown(partial_answer(text) or "_Agent thinking..._")
+            if "result" in event:
+                final = event["result"]
+        return str(final) if final is not None else text, tools_seen
+
+    raw, tools_seen = asyncio.run(consume())
+    print(raw)
+    return parse_result(raw, tools_seen)
+
 #-------streamlit UI----------------------------
 
 st.set_page_config(page_title="Strands Paper Assistant 🤖", layout="wide")
@@ -65,6 +161,9 @@ st.title("Strands Paper Assistant  🤖")
 if "history" not in st.session_state:
     st.session_state.history = []
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex # key of this session's agent in the pool
+
 if "show_markdown" in st.session_state and st.session_state.show_markdown:
     markdown_window()
 
@@ -95,6 +194,29 @@ with st.sidebar:
                 if st.button(f"📄 {fn}", key=fn):
                     os.startfile(os.path.abspath(f"{DOCUMENT_FOLDER}/{fn}"))
 
+    st.header("Manage Papers")
+    papers = sorted(fn for fn in os.listdir(DOCUMENT_FOLDER) if fn.lower().endswith(('.txt', '.pdf')))
+    if not papers:
+        st.info("No papers to manage!")
+    else:
+        selected = st.selectbox("Paper", papers)
+        col_reindex, col_remove = st.columns(2)
+        if col_reindex.button("Re-index"):
+            with st.spinner("Re-indexing..."):
+                n = replace_document(selected)
+            st.success(f"Re-indexed `{selected}` with {n} chunks")
+        if col_remove.button("Remove"):
+            n = remove_document(selected, delete_file=True)
+            st.toast(f"Removed `{selected}` and its {n} chunks")
+            st.rerun()
+        tags = st.text_input("Tags (comma separated)", key=f"tags_{selected}")
+        if st.button("Save tags"):
+            try:
+                saved = set_document_tags(selected, tags.split(","))
+                st.success(f"Tagged `{selected}`: {', '.join(saved) or 'no tags'}")
+            except ValueError as e: # not ingested yet
+                st.error(str(e))
+
     st.header("Created Documents")
     if not os.listdir('created_documents'):
         st.info("No created docs yet!")
@@ -108,6 +230,8 @@ with st.sidebar:
                 if st.button(f"📄 {fn}", key=fn):
                     os.startfile(os.path.abspath(f"created_documents/{fn}"))
     
+    STREAM = st.checkbox("Stream agent progress", value=True)
+    USE_ANSWER_CACHE = st.checkbox("Reuse answers to similar questions", value=True)
     if st.button("⚠ DELETE ALL VECTORS & FILES"):
         delete_all_vectors()
         for filename in os.listdir(DOCUMENT_FOLDER):
@@ -127,15 +251,37 @@ query = st.text_input("Ask anything about your papers.")
 col_run, col_clear = st.columns([1,1])
 
 if col_run.button("Ask") and query:
-    with st.spinner("Agent thinking..."):
-        raw_result = agent(query) #call agent, agent returns an object AgentResult, but the response inside we ask for JSON already
-        print(raw_result)
-        result = json.loads(str(raw_result))
+    version = corpus_version() # read before running, so an answer is never cached against documents ingested during the run
+    queue_box = st.empty()
+    with get_agent_pool().session(st.session_state.session_id, on_wait=show_queue_position(queue_box)) as agent:
+        queue_box.empty()
+        # only a session's first question is answered from or added to the cache, later answers depend on the conversation
+        first_turn = not agent.messages
+        cached = get_answer_cache().lookup(query, PROMPT_HASH, version) if USE_ANSWER_CACHE and first_turn else None
+        if cached:
+            answer, cached_query = cached
+            remember_cached_answer(agent, query, answer)
+            result = {**answer, "search_result": "CACHE", "cached_query": cached_query}
+        elif STREAM:
+            st.markdown(f"### ❓ {query}")
+            with st.status("Agent working...", expanded=True) as status:
+                result = run_agent_streaming(agent, query, status, st.empty())
+                status.update(label="Done", state="complete", expanded=False)
+        else:
+            with st.spinner("Agent thinking..."):
+                raw_result = agent(query) #call agent, agent returns an object AgentResult, but the response inside we ask for JSON already
+                print(raw_result)
+                result = parse_result(str(raw_result), [])
+    # answers from runs that created or converted documents are not reused, the files would not be written again
+    made_documents = {"create_document", "convert_markdown_document"} & set(result.get("tool_used") or [])
+    if not cached and first_turn and USE_ANSWER_CACHE and not made_documents and result.get("answer") not in ("", "insufficient_context"):
+        get_answer_cache().store(query, PROMPT_HASH, version, result)
     st.session_state.history.append((query, result))
     st.rerun()
 
 if col_clear.button("Clear history"):
     st.session_state.history = []
+    get_agent_pool().reset(st.session_state.session_id) # the agent forgets the conversation too
     
 for q, res in reversed(st.session_state.history):
     st.markdown(f"### ❓ {q}")
@@ -143,12 +289,14 @@ for q, res in reversed(st.session_state.history):
     search_res = res.get("search_result", "MODEL")
     if search_res == "LOCAL":
         st.success("✅ Found in local DB")
+    elif search_res == "CACHE":
+        st.success(f"⚡ Cached answer to a similar question: “{res.get('cached_query', '')}”")
     else:
         st.info("ℹ️ Model's answer")
-    
+
     st.write(res.get("answer", ""))
     
-    if search_res == "LOCAL":
+    if search_res in ("LOCAL", "CACHE"): # a cached answer has sources if it was found in local DB
         render_sources(res.get("sources"))
         
     # For debugging, to trace what the agent tool call
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+'''
+Benchmark of the vector index backends on synthetic embeddings: ChromaDB, and the NumPy index (numpy_index.py)
+in float16 and int8. For each it reports the time to build the index, the startup time (a fresh process opening
+the index and answering one query) and its peak memory, the query latency with and without a metadata filter,
+and the recall of the top k against exact float32 search.
+
+    python benchmark_backends.py [--chunks 20000] [--dim 384] [--queries 200] [--k 5] [--backends chroma float16 int8]
+
+The embedding model is not run, so only the index itself is measured.
+'''
+
+BATCH_SIZE = 5000 # chunks written per upsert, ChromaDB rejects much larger batches
+DOCUMENTS = 200 # the chunks are spread over this many documents, the filtered queries search 5 of them
+
+def make_data(chunks, dim, queries, seed=0):
+    """
+    Clustered, normalised embeddings like those of real chunks, and queries close to some of them.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(chunks // 100, 1), dim))
+    embeddings = centers[rng.integers(0, len(centers), chunks)] + 0.6 * rng.standard_normal((chunks, dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    query_embeddings = embeddings[rng.integers(0, chunks, queries)] + 0.3 * rng.standard_normal((queries, dim)) / np.sqrt(dim)
+    return embeddings.astype(np.float32), query_embeddings.astype(np.float32)
+
+def metadata(i):
+    return {"name": f"documents/paper{i % DOCUMENTS}.pdf", "page_number": i % 12, "chunk_number": i}
+
+def open_collection(backend, path):
+    if backend == "chroma":
+        import chromadb
+        return chromadb.PersistentClient(path=path).get_or_create_collection(name="contents")
+    from numpy_index import NumpyClient
+    return NumpyClient(path, dtype=backend).get_or_create_collection(name="contents")
+
+def exact_top_k(embeddings, query_embeddings, k, allowed=None):
+    distances = (np.sum(embeddings ** 2, axis=1)[:, None] - 2 * embeddings @ query_embeddings.T) # + |q|^2, same for every row
+    if allowed is not None:
+        distances[~allowed] = np.inf
+    return [set(np.argsort(distances[:, i])[:k]) for i in range(len(query_embeddings))]
+
+def percentile_ms(seconds, q):
+    return float(np.percentile(seconds, q) * 1000)
+
+def run_queries(collection, query_embeddings, k, where=None):
+    latencies = []
+    found = []
+    for query_embedding in query_embeddings:
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[query_embedding.tolist()], n_results=k, **({"where": where} if where else {}))
+        latencies.append(time.perf_counter() - start)
+        found.append({int(chunk_id) for chunk_id in results["ids"][0]})
+    return latencies, found
+
+def recall(found, truth, k):
+    return float(np.mean([len(f & t) / k for f, t in zip(found, truth)]))
+
+def peak_memory_mb() -> float:
+    """
+    Peak resident memory of this process. ru_maxrss is kept across exec on Linux, so it would include the parent's.
+    """
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def startup(backend, path, dim):
+    """
+    Open the index and answer one query in a fresh process. Returns (seconds, peak memory in MB).
+    """
+    code = (
+        "import time, sys; start = time.perf_counter(); sys.path.insert(0, sys.argv[1]); "
+        "from benchmark_backends import open_collection, peak_memory_mb; "
+        f"collection = open_collection({backend!r}, {path!r}); "
+        f"collection.query(query_embeddings=[[0.1] * {dim}], n_results=5); "
+        "print(time.perf_counter() - start, peak_memory_mb())"
+    )
+    result = subprocess.run([sys.executable, "-c", code, os.path.dirname(os.path.abspath(__file__))], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    seconds, memory = result.stdout.split()[-2:]
+    return float(seconds), float(memory)
+
+def benchmark(backend, embeddings, query_embeddings, k, folder):
+    path = f"{folder}/{backend}"
+    collection = open_collection(backend, path)
+    start = time.perf_counter()
+    for i in range(0, len(embeddings), BATCH_SIZE):
+        rows = range(i, min(i + BATCH_SIZE, len(embeddings)))
+        collection.upsert(ids=[str(j) for j in rows], documents=[f"chunk {j}" for j in rows],
+                          metadatas=[metadata(j) for j in rows], embeddings=embeddings[i:i + BATCH_SIZE].tolist())
+    build = time.perf_counter() - start
+
+    names = [f"documents/paper{i}.pdf" for i in range(5)]
+    allowed = np.arange(len(embeddings)) % DOCUMENTS < 5
+    latencies, found = run_queries(collection, query_embeddings, k)
+    filtered_latencies, filtered_found = run_queries(collection, query_embeddings, k, {"name": {"$in": names}})
+    startup_seconds, memory = startup(backend, path, embeddings.shape[1])
+    return {
+        "backend": backend,
+        "build_s": round(build, 2),
+        "startup_s": round(startup_seconds, 2),
+        "peak_memory_mb": round(memory),
+        "query_p50_ms": round(percentile_ms(latencies, 50), 2),
+        "query_p95_ms": round(percentile_ms(latencies, 95), 2),
+        "filtered_p50_ms": round(percentile_ms(filtered_latencies, 50), 2),
+        f"recall@{k}": round(recall(found, exact_top_k(embeddings, query_embeddings, k), k), 3),
+        f"filtered_recall@{k}": round(recall(filtered_found, exact_top_k(embeddings, query_embeddings, k, allowed), k), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vector index backends.")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384) # all-MiniLM-L6-v2
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "float16", "int8"])
+    args = parser.parse_args()
+
+    embeddings, query_embeddings = make_data(args.chunks, args.dim, args.queries)
+    print(f"{args.chunks} chunks of {args.dim} dimensions, {args.queries} queries, top {args.k}")
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for backend in args.backends:
+            try:
+                results.append(benchmark(backend, embeddings, query_embeddings, args.k, folder))
+            except ImportError as e:
+                print(f"Skipping {backend}: {e}")
+                continue
+            print(json.dumps(results[-1]))
+
+    if results:
+        columns = list(results[0])
+        print()
+        print("  ".join(f"{column:>{max(len(column), 8)}}" for column in columns))
+        for result in results:
+            print("  ".join(f"{str(result[column]):>{max(len(column), 8)}}" for column in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import re
+import secrets
+from pdf_parser import * # our PDF parser module!
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD
+from numpy_index import VECTOR_BACKEND
+
+'''
+Responsible for reading files and splitting them into chunks ready to be stored in ChromaDB.
+Does not touch ChromaDB itself, so it is safe to run inside ingestion worker processes.
+
+CHUNK_PROFILE selects how files are split:
+- characters: chunks of CHUNK_SIZE characters overlapping by CHUNK_OVERLAP (the original splitting)
+- low-overlap: chunks of CHUNK_SIZE characters overlapping by LOW_OVERLAP, so far less text is embedded twice
+- tokens: chunks of at most CHUNK_TOKENS tokens of the embedding model, so no chunk is truncated when embedded
+- sections: low-overlap chunks that never cross a section heading, each tagged with its section
+'''
+
+CHUNK_PROFILE = os.getenv("CHUNK_PROFILE", "characters")
+CHUNK_SIZE = 1500    # max size of each chunk (in characters, not tokens)
+CHUNK_OVERLAP = 500  # overlap between chunks
+LOW_OVERLAP = int(os.getenv("CHUNK_LOW_OVERLAP", 150)) # overlap of the low-overlap and sections profiles
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 256)) # max tokens per chunk, all-MiniLM-L6-v2 truncates its input at 256
+CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", 32))
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")) # tokenizer of the embedding model
+PROFILES = ("characters", "low-overlap", "tokens", "sections")
+
+SECTION_NAMES = {
+    "abstract", "introduction", "background", "related work", "method", "methods", "methodology", "approach",
+    "experiments", "evaluation", "results", "discussion", "limitations", "conclusion", "conclusions",
+    "future work", "references", "bibliography", "acknowledgements", "acknowledgments", "appendix", "summary",
+}
+_NUMBERED_HEADING = re.compile(r"^(\d{1,2}(\.\d{1,2})*\.?|[IVX]{1,4}\.)\s+[A-Z][A-Za-z]")
+
+def ingest_settings(profile=CHUNK_PROFILE) -> dict:
+    """
+    Settings that affect how files are split and stored. Files stored with different settings are re-indexed.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown CHUNK_PROFILE {profile}, use one of {', '.join(PROFILES)}.")
+    if profile == "characters":
+        settings = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    elif profile == "tokens":
+        settings = {"profile": profile, "chunk_tokens": CHUNK_TOKENS, "chunk_overlap": CHUNK_TOKEN_OVERLAP, "tokenizer": CHUNK_TOKENIZER}
+    else:
+        settings = {"profile": profile, "chunk_size": CHUNK_SIZE, "chunk_overlap": LOW_OVERLAP}
+    if NEAR_DUPLICATE_THRESHOLD:
+        settings["near_duplicate_threshold"] = NEAR_DUPLICATE_THRESHOLD
+    if VECTOR_BACKEND != "chroma":
+        settings["vector_backend"] = VECTOR_BACKEND # the other backend's index is empty, so everything is stored again there
+    settings["chunk_ids"] = "positional" # files stored with content hash IDs are re-indexed, their embeddings are cached
+    return settings
+
+def heading(line:str):
+    """
+    Get the section title if a line looks like a heading, otherwise None.
+    """
+    line = line.strip()
+    if not 3 <= len(line) <= 80:
+        return None
+    if line.startswith("#"):
+        return line.lstrip("#").strip() or None
+    words = len(line.split())
+    if _NUMBERED_HEADING.match(line) and words <= 10 and not line.endswith((".", ",", ";", ":")):
+        return line
+    if line.lower().rstrip(":") in SECTION_NAMES:
+        return line.rstrip(":")
+    if line.isupper() and words <= 8 and re.search(r"[A-Z]{3}", line):
+        return line
+    return None
+
+_tokenizer = None
+
+def count_tokens(text:str) -> int:
+    """
+    Count the tokens of text with the embedding model's tokenizer, loaded on first use.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        from tokenizers import Tokenizer # installed with chromadb and sentence-transformers
+        name = CHUNK_TOKENIZER if "/" in CHUNK_TOKENIZER else f"sentence-transformers/{CHUNK_TOKENIZER}"
+        _tokenizer = Tokenizer.from_pretrained(name)
+        _tokenizer.no_truncation()
+    return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+
+_splitters = {}
+
+def get_splitter(profile=CHUNK_PROFILE):
+    if profile not in _splitters:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter # slow to import, only needed when storing
+        separators = ["\n\n", "\n", " ", ""]  # splitting priority
+        if profile == "tokens":
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=CHUNK_TOKENS - 2, # room for the model's start and end tokens
+                chunk_overlap=CHUNK_TOKEN_OVERLAP,
+                length_function=count_tokens,
+                separators=separators,
+            )
+        else:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP if profile == "characters" else LOW_OVERLAP,
+                separators=separators,
+            )
+        _splitters[profile] = splitter
+    return _splitters[profile]
+
+def split_text(content, profile=CHUNK_PROFILE):
+    """
+    Split the content into chunks for processing
+    """
+    return get_splitter(profile).split_text(content)
+
+def split_sections(content, section=None):
+    """
+    Split content at its section headings. Returns (section title, text) pairs in order.
+    Text before the first heading belongs to section, the section the content starts in.
+    """
+    sections = []
+    lines = []
+    for line in content.splitlines(keepends=True):
+        title = heading(line)
+        if title:
+            if "".join(lines).strip():
+                sections.append((section, "".join(lines)))
+            section, lines = title, []
+        lines.append(line)
+    if "".join(lines).strip():
+        sections.append((section, "".join(lines)))
+    return sections
+
+def source_key() -> str:
+    """
+    Make a new key for one stored version of a source file. Part of the IDs of its chunks.
+    It is kept in the file's manifest entry, so a renamed file keeps it, and it does not depend on the name or content,
+    so the same content stored again under another name, or the name it had before a rename, gets other chunk IDs.
+    """
+    return secrets.token_hex(8)
+
+def chunk_id(key:str, page_number:int, ordinal:int) -> str:
+    return f"{key}:{page_number}:{ordinal}"
+
+def parse_chunk_id(chunk_id:str):
+    """
+    Get (source key, page number, ordinal) from a chunk ID, or None for a content hash ID from before IDs were positional.
+    """
+    parts = chunk_id.rsplit(":", 2)
+    if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[1]), int(parts[2])
+
+def make_records(chunks, metadata, content, key, previous_page_chunks=0):
+    """
+    Turn a list of chunks of content into (id, chunk, metadata) records, removing duplicates but keeping their order.
+    IDs are positional: the source key, the page and the chunk's ordinal on the page, so neighbouring chunks can be looked up by ID.
+    Every record gets a copy of metadata plus its chunk_number, its start_char and end_char in content,
+    and the number of chunks on its page and on the page before.
+    """
+    chunks = list(dict.fromkeys(chunks)) # remove duplicates
+    page_number = metadata.get("page_number", 0)
+    records = []
+    search_from = 0
+    for i, chunk in enumerate(chunks):
+        start = content.find(chunk, search_from) # chunks are in order, so each starts after the previous one's start
+        if start == -1:
+            start = content.find(chunk)
+        if start != -1:
+            search_from = start + 1
+        records.append((chunk_id(key, page_number, i), chunk, {
+            **metadata,
+            "chunk_number": i,
+            "start_char": start,
+            "end_char": start + len(chunk) if start != -1 else -1,
+            "page_chunks": len(chunks),
+            "previous_page_chunks": previous_page_chunks,
+        }))
+    return records
+
+def split_page(content, metadata, key, previous_page_chunks=0, profile=CHUNK_PROFILE, section=None):
+    """
+    Split one page (or a whole text file) into records. Returns the records and the section the page ends in.
+    """
+    if profile != "sections":
+        return make_records(split_text(content, profile), metadata, content, key, previous_page_chunks), section
+    chunks = []
+    sections = []
+    for section, text in split_sections(content, section):
+        for chunk in split_text(text, profile):
+            chunks.append(chunk)
+            sections.append(section)
+    records = make_records(chunks, metadata, content, key, previous_page_chunks)
+    section_of = dict(zip(chunks, sections))
+    for _, chunk, chunk_metadata in records:
+        if section_of[chunk] is not None:
+            chunk_metadata["section"] = section_of[chunk]
+    return records, section
+
+def prepare_document(file_name:str, key:str, profile=CHUNK_PROFILE):
+    """
+    Read and split a .txt or .pdf file, with key from source_key() in the IDs of its chunks.
+    Returns a list of (id, chunk, metadata) records, ready to be upserted into a collection.
+    """
+    records = []
+    if file_name.endswith(".txt"):
+        with open(file_name, "r") as f:
+            records.extend(split_page(f.read(), {"name": file_name}, key, profile=profile)[0])
+    elif file_name.endswith(".pdf"):
+        section = None # sections carry over from one page to the next
+        page_records = []
+        with PdfDocument(file_name) as document:
+            for page_number, page_content in enumerate(document): # pages are streamed, not held in memory all at once
+                page_records, section = split_page(page_content, {"name": file_name, "page_number": page_number}, key,
+                                                   len(page_records), profile, section)
+                records.extend(page_records)
+    return records
@@ -0,0 +1,44 @@
+import os
+import threading
+from collections import defaultdict
+
+'''
+Converts created markdown documents to other formats. Kept in its own module so the conversion can run
+in a worker process without loading the rest of the stack. The converters are slow to import, so they are only imported when used.
+'''
+
+CREATED_FOLDER = "created_documents"
+
+_document_locks = defaultdict(threading.Lock) # created document name -> lock held while it is written or converted
+_document_locks_guard = threading.Lock()
+
+def document_lock(document_name) -> threading.Lock:
+    """
+    Get the lock for a created document, so writing and converting the same document never overlap.
+    """
+    if not document_name.endswith('.md'):
+        document_name += '.md'
+    with _document_locks_guard:
+        return _document_locks[document_name]
+
+def convert_markdown(document_name, document_type):
+    """
+    Convert created_documents/<document_name> to pdf or docx, saved next to it.
+    Returns the absolute path to the converted document, or an error message.
+    """
+    if not os.path.exists(f"{CREATED_FOLDER}/{document_name}"):
+        return f"No documents named {document_name}. Use get_created_documents() to find the exact name."
+    if document_type == "pdf":
+        import markdown_pdf
+        pdf = markdown_pdf.MarkdownPdf()
+        with open(f"{CREATED_FOLDER}/{document_name}", 'r') as f:
+            pdf.add_section(markdown_pdf.Section(f.read()))
+        pdf.save(f"{CREATED_FOLDER}/{document_name}.pdf")
+    elif document_type == "docx":
+        import spire.doc
+        document = spire.doc.Document()
+        document.LoadFromFile(f"{CREATED_FOLDER}/{document_name}", spire.doc.FileFormat.Markdown)
+        document.SaveToFile(f"{CREATED_FOLDER}/{document_name}.docx", spire.doc.FileFormat.Docx2016)
+    else:
+        return "Unknown type of document, only supports pdf or docx."
+    return os.path.abspath(f"{CREATED_FOLDER}/{document_name}.{document_type}")
@@ -0,0 +1,207 @@
+import os
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+
+'''
+Long-lived document service. One process owns the ChromaDB index, the embedding model and the caches,
+and the Streamlit apps, the MCP server and the agent tools call it over a local socket instead of each loading their own copy.
+
+Run it with:
+    python doc_service.py
+
+Import the functions below instead of the ones in vector.py. With DOC_SERVICE=auto (default) they call the service
+if it is running, and otherwise fall back to loading vector.py in this process. DOC_SERVICE=on requires the service,
+DOC_SERVICE=off never uses it.
+'''
+
+DOCUMENT_FOLDER = "documents" # same as vector.DOCUMENT_FOLDER, defined here so clients don't have to import vector
+SERVICE_ADDRESS = (os.getenv("DOC_SERVICE_HOST", "127.0.0.1"), int(os.getenv("DOC_SERVICE_PORT", 4300)))
+SERVICE_KEY_FILE = "vectordata/doc_service.key" # written by the service on its first start, readable only by its owner
+USE_SERVICE = os.getenv("DOC_SERVICE", "auto") # auto, on or off
+
+# functions of vector.py served by the service, and the ones that write to the index, which run one at a time
+SERVED = [
+    "store_content", "store_many", "sync_folder", "remove_document", "replace_document", "delete_all_vectors", "set_document_tags",
+    "query_content", "query_content_many", "embed_queries", "expand_hit", "document_catalog", "corpus_version", "warm_up", "health",
+    "list_shards", "rebuild_shard", "backup_shard", "detach_shard", "attach_shard",
+]
+WRITES = {
+    "store_content", "store_many", "sync_folder", "remove_document", "replace_document", "delete_all_vectors", "set_document_tags",
+    "rebuild_shard", "backup_shard", "detach_shard", "attach_shard", # backups run alone too, so they are consistent
+}
+
+def service_key(create=False):
+    """
+    Get the key clients authenticate with: DOC_SERVICE_KEY if it is set, otherwise the key in SERVICE_KEY_FILE.
+    With create, a random key is written to the file if there is none yet. Returns None if there is no key.
+    The connection unpickles what it receives, so the key must not be guessable.
+    """
+    if os.getenv("DOC_SERVICE_KEY"):
+        return os.getenv("DOC_SERVICE_KEY").encode()
+    if create:
+        os.makedirs(os.path.dirname(SERVICE_KEY_FILE), exist_ok=True)
+        try:
+            fd = os.open(SERVICE_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+    if not os.path.exists(SERVICE_KEY_FILE):
+        return None
+    with open(SERVICE_KEY_FILE, "r") as f:
+        return f.read().strip().encode()
+
+#---------- client ----------
+
+_local = threading.local() # one connection per thread, connections are not thread safe
+_mode = None # "service" or "local", decided on the first call
+
+def _connection():
+    if getattr(_local, "connection", None) is None:
+        key = service_key()
+        if key is None: # the service has never been started here
+            raise ConnectionRefusedError(f"No document service key in {SERVICE_KEY_FILE} or DOC_SERVICE_KEY.")
+        _local.connection = Client(SERVICE_ADDRESS, authkey=key)
+    return _local.connection
+
+def _call_service(name, args, kwargs):
+    try:
+        connection = _connection()
+        connection.send((name, args, kwargs))
+        status, result = connection.recv()
+    except (OSError, EOFError):
+        _local.connection = None
+        raise ConnectionError(f"Document service at {SERVICE_ADDRESS[0]}:{SERVICE_ADDRESS[1]} is not reachable.")
+    if status == "error":
+        raise result
+    return result
+
+def _call(name, *args, **kwargs):
+    global _mode
+    if _mode is None:
+        _mode = "local"
+        if USE_SERVICE != "off":
+            try:
+                _connection()
+                _mode = "service"
+            except OSError:
+                if USE_SERVICE == "on":
+                    raise ConnectionError(f"Document service at {SERVICE_ADDRESS[0]}:{SERVICE_ADDRESS[1]} is not running, start it with python doc_service.py")
+                print("Document service is not running, loading the index in this process...")
+    if _mode == "service":
+        return _call_service(name, args, kwargs)
+    import vector # only loaded when there is no service to call
+    return getattr(vector, name)(*args, **kwargs)
+
+def using_service() -> bool:
+    return _mode == "service"
+
+def store_content(*args, **kwargs):
+    return _call("store_content", *args, **kwargs)
+
+def store_many(*args, **kwargs):
+    return _call("store_many", *args, **kwargs)
+
+def sync_folder(*args, **kwargs):
+    return _call("sync_folder", *args, **kwargs)
+
+def remove_document(*args, **kwargs):
+    return _call("remove_document", *args, **kwargs)
+
+def replace_document(*args, **kwargs):
+    return _call("replace_document", *args, **kwargs)
+
+def delete_all_vectors(*args, **kwargs):
+    return _call("delete_all_vectors", *args, **kwargs)
+
+def set_document_tags(*args, **kwargs):
+    return _call("set_document_tags", *args, **kwargs)
+
+def query_content(*args, **kwargs):
+    return _call("query_content", *args, **kwargs)
+
+def query_content_many(*args, **kwargs):
+    return _call("query_content_many", *args, **kwargs)
+
+def embed_queries(*args, **kwargs):
+    return _call("embed_queries", *args, **kwargs)
+
+def expand_hit(*args, **kwargs):
+    return _call("expand_hit", *args, **kwargs)
+
+def document_catalog(*args, **kwargs):
+    return _call("document_catalog", *args, **kwargs)
+
+def list_shards(*args, **kwargs):
+    return _call("list_shards", *args, **kwargs)
+
+def rebuild_shard(*args, **kwargs):
+    return _call("rebuild_shard", *args, **kwargs)
+
+def backup_shard(*args, **kwargs):
+    return _call("backup_shard", *args, **kwargs)
+
+def detach_shard(*args, **kwargs):
+    return _call("detach_shard", *args, **kwargs)
+
+def attach_shard(*args, **kwargs):
+    return _call("attach_shard", *args, **kwargs)
+
+def corpus_version():
+    return _call("corpus_version")
+
+def warm_up():
+    return _call("warm_up")
+
+def health() -> dict:
+    """
+    Get the readiness of the index and models, see vector.health(). Includes whether the service is used.
+    """
+    return {**_call("health"), "service": using_service()}
+
+#---------- server ----------
+
+def _handle(connection, functions, write_lock):
+    with connection:
+        while True:
+            try:
+                name, args, kwargs = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if name not in functions:
+                    raise AttributeError(f"Document service has no function {name}")
+                if name in WRITES:
+                    with write_lock:
+                        result = functions[name](*args, **kwargs)
+                else:
+                    result = functions[name](*args, **kwargs)
+                connection.send(("ok", result))
+            except Exception as e:
+                try:
+                    connection.send(("error", e))
+                except Exception: # the exception itself can't be sent
+                    connection.send(("error", RuntimeError(repr(e))))
+
+def serve(address=SERVICE_ADDRESS):
+    """
+    Load the index, embedding model and caches once, then serve calls until stopped.
+    """
+    import vector
+    vector.warm_up() # the point of the service is to load everything once, up front
+    functions = {name: getattr(vector, name) for name in SERVED}
+    write_lock = threading.Lock()
+    with Listener(address, authkey=service_key(create=True)) as listener:
+        print(f"Document service listening on {address[0]}:{address[1]}...")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e: # failed handshake, e.g. wrong key
+                print(f"Rejected connection: {e}")
+                continue
+            threading.Thread(target=_handle, args=(connection, functions, write_lock), daemon=True).start()
+
+if __name__ == "__main__":
+    serve()
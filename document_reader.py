@@ -0,0 +1,152 @@
+import os
+import re
+from pdf_parser import PdfDocument
+from doc_service import DOCUMENT_FOLDER
+
+'''
+Windowed reading of stored documents, so tools can return a part of a document instead of all of it.
+PDFs are read page by page. Text files are split into virtual pages of about TEXT_PAGE_CHARS characters, ending at a line break.
+A document's text is its pages one after another, character and token offsets count into that text.
+
+Ranges are strings:
+    "3"               page 3 (pages are 1-indexed)
+    "2-4"             pages 2 to 4
+    "5@1200-6"        page 5 from its character 1200, to the end of page 6
+    "chars:0-5000"    characters 0 to 5000 of the text, "chars:5000-" to the end
+    "tokens:0-1000"   the same in tokens, about CHARS_PER_TOKEN characters each
+Results are capped at max_chars characters. A result that was cut off has a next_cursor, a range that continues where it stopped.
+'''
+
+TEXT_PAGE_CHARS = int(os.getenv("TEXT_PAGE_CHARS", 3000)) # size of a virtual page of a text file
+MAX_CHARS = int(os.getenv("DOCUMENT_MAX_CHARS", 12000)) # characters returned by one call, across all its ranges
+CHARS_PER_TOKEN = 4
+
+class TextDocument:
+    """
+    Text file with the same interface as PdfDocument: len() gives the number of virtual pages, doc[i] page i (0-indexed).
+    """
+    def __init__(self, filename, page_chars=TEXT_PAGE_CHARS):
+        self.filename = filename
+        with open(filename, "r", encoding="utf-8", errors="replace") as f:
+            self.text = f.read()
+        self.starts = [0] # offset each page starts at
+        while len(self.text) - self.starts[-1] > page_chars:
+            start = self.starts[-1]
+            end = self.text.rfind("\n", start + page_chars // 2, start + page_chars) # prefer ending the page at a line break
+            self.starts.append(end + 1 if end != -1 else start + page_chars)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, page_index) -> str:
+        page_index = range(len(self))[page_index] # raises IndexError like a list
+        end = self.starts[page_index + 1] if page_index + 1 < len(self) else len(self.text)
+        return self.text[self.starts[page_index]:end]
+
+    def __iter__(self):
+        for page_index in range(len(self)):
+            yield self[page_index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def open_document(filename):
+    """
+    Open a stored document for windowed reading, or raise ValueError if its type is not supported.
+    """
+    if filename.endswith(".pdf"):
+        return PdfDocument(filename)
+    if filename.endswith(".txt"):
+        return TextDocument(filename)
+    raise ValueError(f"Only .pdf and .txt documents are supported, got {os.path.basename(filename)}.")
+
+_PAGES = re.compile(r"^(\d+)(?:@(\d+))?(?:-(\d+))?$")
+_OFFSETS = re.compile(r"^(chars|tokens):(\d+)-(\d*)$")
+
+def _read_pages(document, first, offset, last, budget):
+    count = len(document)
+    if not 1 <= first <= count or last < first:
+        raise ValueError(f"pages {first}-{last} are out of range, the document has {count} pages")
+    last = min(last, count)
+    parts = []
+    for page_number in range(first, last + 1):
+        text = document[page_number - 1][offset:]
+        parts.append(f"[Page {page_number}]\n" if offset == 0 else f"[Page {page_number}, from character {offset}]\n")
+        if len(text) > budget:
+            parts.append(text[:budget])
+            return "".join(parts), f"{page_number}@{offset + budget}-{last}"
+        parts.append(text + "\n")
+        budget -= len(text)
+        offset = 0
+    return "".join(parts), None
+
+def _read_chars(document, start, end, budget):
+    stop = start + budget if end is None else min(end, start + budget)
+    parts = []
+    position = 0 # offset of the current page in the document's text
+    at_end = True # whether the text reaches the end of the document
+    for page in document:
+        if position >= stop:
+            at_end = False
+            break
+        if position + len(page) > start:
+            parts.append(page[max(start - position, 0):stop - position])
+        position += len(page)
+    at_end = at_end and position <= stop
+    text = "".join(parts)
+    done = end is not None and start + len(text) >= end or at_end # reached the end of the range or of the document
+    return text, None if done else f"chars:{start + len(text)}-{'' if end is None else end}"
+
+def read_range(document, spec:str, max_chars=MAX_CHARS) -> dict:
+    """
+    Read one range of an opened document, see the module docstring for the range format.
+    Returns the range, the text and next_cursor, which is None unless the text was cut off at max_chars.
+    """
+    spec = str(spec).strip().replace(" ", "")
+    pages = _PAGES.match(spec)
+    offsets = _OFFSETS.match(spec)
+    if pages:
+        first = int(pages.group(1))
+        last = int(pages.group(3) or first)
+        text, cursor = _read_pages(document, first, int(pages.group(2) or 0), last, max_chars)
+    elif offsets:
+        scale = CHARS_PER_TOKEN if offsets.group(1) == "tokens" else 1
+        end = int(offsets.group(3)) * scale if offsets.group(3) else None
+        text, cursor = _read_chars(document, int(offsets.group(2)) * scale, end, max_chars)
+    else:
+        raise ValueError(f'unknown range "{spec}", use e.g. "3", "2-4", "chars:0-5000" or "tokens:0-1000"')
+    return {"range": spec, "text": text, "next_cursor": cursor}
+
+def read_stored_document(document_name, ranges, max_chars=MAX_CHARS, folder=DOCUMENT_FOLDER):
+    """
+    read_document() for the document tools: reads a document in folder by its name, and returns errors as a message for the model.
+    """
+    if not os.path.isfile(f"{folder}/{document_name}"):
+        return f"No documents named {document_name}. Use get_document_names() to find the exact name."
+    try:
+        return read_document(f"{folder}/{document_name}", ranges, max_chars)
+    except ValueError as e:
+        return str(e)
+
+def read_document(filename, ranges, max_chars=MAX_CHARS) -> dict:
+    """
+    Read several ranges of a document in one go, sharing max_chars between them in order.
+    Ranges that did not fit get no text and their whole range as next_cursor.
+    """
+    with open_document(filename) as document:
+        results = []
+        budget = max_chars
+        for spec in ranges:
+            if budget <= 0:
+                results.append({"range": spec, "text": "", "next_cursor": spec})
+                continue
+            try:
+                result = read_range(document, spec, budget)
+            except (ValueError, IndexError) as e:
+                result = {"range": spec, "error": str(e)}
+            budget -= len(result.get("text", ""))
+            results.append(result)
+        return {"document": os.path.basename(filename), "pages": len(document), "ranges": results}
@@ -0,0 +1,104 @@
+import os
+from chromadb import EmbeddingFunction
+from chromadb.utils import embedding_functions
+
+'''
+Configurable embedding layer for the contents collection. Set these in the environment (or .env):
+- EMBEDDING_BACKEND: default (ChromaDB's built-in ONNX all-MiniLM-L6-v2), sentence-transformers (PyTorch) or onnx (sentence-transformers with ONNX Runtime)
+- EMBEDDING_MODEL: sentence-transformers model name, ignored by the default backend
+- EMBEDDING_QUANTIZE: int8 to use an int8-quantized model on CPU
+- EMBEDDING_BATCH_SIZE: chunks embedded per forward pass
+- EMBEDDING_THREADS: intra-op threads used by the model
+'''
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "default")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", os.cpu_count() or 1))
+ONNX_INT8_FILE = os.getenv("ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx") # quantized file inside the model repo
+
+def model_key(backend=EMBEDDING_BACKEND, model=EMBEDDING_MODEL, quantize=EMBEDDING_QUANTIZE) -> str:
+    """
+    Identify the model that produces the embeddings. Embeddings with different keys must never be mixed.
+    """
+    if backend == "default":
+        return "default:all-MiniLM-L6-v2"
+    return f"{backend}:{model}" + (f":{quantize}" if quantize else "")
+
+class BatchedEmbeddingFunction(EmbeddingFunction):
+    """
+    Base class: splits the input into batches of batch_size and embeds them one by one.
+    """
+    def __init__(self, key, batch_size=EMBEDDING_BATCH_SIZE):
+        self.key = key
+        self.batch_size = batch_size
+
+    def __call__(self, input):
+        embeddings = []
+        for i in range(0, len(input), self.batch_size):
+            embeddings.extend(self.embed_batch(list(input[i:i+self.batch_size])))
+        return embeddings
+
+    def embed_batch(self, texts) -> list:
+        raise NotImplementedError
+
+    def warm_up(self):
+        """
+        Load the model and run it once, so the first real query does not pay for it.
+        """
+        self(["warm up"])
+
+class DefaultEmbedding(BatchedEmbeddingFunction):
+    def __init__(self, batch_size=EMBEDDING_BATCH_SIZE):
+        super().__init__(model_key("default"), batch_size)
+        self.function = embedding_functions.DefaultEmbeddingFunction()
+
+    def embed_batch(self, texts):
+        return list(self.function(texts))
+
+class SentenceTransformerEmbedding(BatchedEmbeddingFunction):
+    def __init__(self, model=EMBEDDING_MODEL, backend="sentence-transformers", quantize=EMBEDDING_QUANTIZE,
+                 batch_size=EMBEDDING_BATCH_SIZE, threads=EMBEDDING_THREADS):
+        super().__init__(model_key(backend, model, quantize), batch_size)
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(threads)
+        if backend == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            model_kwargs = {"session_options": options, "provider": "CPUExecutionProvider"}
+            if quantize == "int8":
+                model_kwargs["file_name"] = ONNX_INT8_FILE
+            self.model = SentenceTransformer(model, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            self.model = SentenceTransformer(model, device="cpu")
+            if quantize == "int8":
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed_batch(self, texts):
+        # normalised like the default model, so distances stay comparable
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True).tolist()
+
+def load_embedding_function(backend=EMBEDDING_BACKEND) -> BatchedEmbeddingFunction:
+    """
+    Build the embedding function selected by the EMBEDDING_* settings.
+    """
+    if backend == "default":
+        return DefaultEmbedding()
+    if backend in ("sentence-transformers", "onnx"):
+        return SentenceTransformerEmbedding(backend=backend)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend}, use default, sentence-transformers or onnx.")
+
+def check_collection_model(collection, key:str):
+    """
+    Reject a collection that was built with a different embedding model, instead of silently mixing embeddings.
+    Collections created before models were recorded were built with the default model.
+    """
+    stored_key = (collection.metadata or {}).get("embedding_model", model_key("default"))
+    if stored_key != key:
+        raise ValueError(
+            f"Collection {collection.name} was embedded with {stored_key}, but the configured model is {key}. "
+            f"Switch back to that model, or delete all vectors and store the documents again."
+        )
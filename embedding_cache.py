@@ -0,0 +1,128 @@
+import os
+import re
+import numpy as np
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+'''
+Content-addressed store of chunk embeddings on disk, keyed by (embedding model, sha256 of the chunk).
+Rebuilding the collection, or re-ingesting a document whose chunks were seen before, then costs a disk read
+instead of running the embedding model again.
+
+Each model gets its own folder with:
+- vectors.f32: the embeddings as raw float32 rows, read through a memory map
+- index: one chunk hash per line, line i is row i of vectors.f32
+- dim: the number of dimensions of each embedding
+Writers append under an exclusive lock on the folder's lock file and reload the index first, so processes
+sharing the folder, like the app and the document service, never give two hashes the same row.
+'''
+
+EMBEDDING_CACHE_FOLDER = "vectordata/embeddings"
+
+class EmbeddingCache:
+    def __init__(self, model:str, folder=EMBEDDING_CACHE_FOLDER):
+        self.folder = f"{folder}/{re.sub(r'[^A-Za-z0-9_.-]+', '_', model)}"
+        self._load()
+
+    def _load(self):
+        """
+        Read the index from disk, dropping what this process had loaded before.
+        """
+        self._rows = {} # chunk hash -> row in vectors.f32
+        self._dim = None
+        self._matrix = None
+        self._index_lines = 0
+        self._index_size = 0 # size of the index file when it was read, to notice rows added by other processes
+        if os.path.exists(f"{self.folder}/dim") and os.path.exists(f"{self.folder}/index"):
+            with open(f"{self.folder}/dim", "r") as f:
+                self._dim = int(f.read())
+            # rows are only valid if both the index line and the vector were written
+            rows = os.path.getsize(f"{self.folder}/vectors.f32") // (self._dim * 4) if os.path.exists(f"{self.folder}/vectors.f32") else 0
+            with open(f"{self.folder}/index", "r") as f:
+                for line in f:
+                    if self._index_lines < rows:
+                        self._rows[line.rstrip("\n")] = self._index_lines
+                    self._index_lines += 1
+                self._index_size = f.tell()
+
+    def _changed(self) -> bool:
+        index_path = f"{self.folder}/index"
+        return (os.path.getsize(index_path) if os.path.exists(index_path) else 0) != self._index_size
+
+    @contextmanager
+    def _lock(self):
+        """
+        Hold an exclusive lock on the folder while writing, shared by every process using the cache.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        with open(f"{self.folder}/lock", "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _vectors(self):
+        if self._matrix is None or len(self._matrix) < len(self._rows):
+            self._matrix = np.memmap(f"{self.folder}/vectors.f32", dtype=np.float32, mode="r", shape=(len(self._rows), self._dim))
+        return self._matrix
+
+    def get_many(self, hashes) -> list:
+        """
+        Get the cached embedding for each hash, or None where it is not cached.
+        """
+        if self._changed():
+            self._load()
+        if not self._rows:
+            return [None] * len(hashes)
+        vectors = self._vectors()
+        return [vectors[self._rows[h]].tolist() if h in self._rows else None for h in hashes]
+
+    def put_many(self, hashes, embeddings):
+        """
+        Add embeddings for hashes that are not cached yet.
+        """
+        if not any(h not in self._rows for h in hashes):
+            return
+        with self._lock():
+            self._load() # another process may have added rows since they were read
+            new = {}
+            for h, embedding in zip(hashes, embeddings):
+                if h not in self._rows:
+                    new[h] = embedding
+            if not new:
+                return
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                with open(f"{self.folder}/dim", "w") as f:
+                    f.write(str(self._dim))
+            vectors_path = f"{self.folder}/vectors.f32"
+            if os.path.exists(vectors_path) and os.path.getsize(vectors_path) > len(self._rows) * self._dim * 4:
+                os.truncate(vectors_path, len(self._rows) * self._dim * 4) # drop rows left over by an interrupted write
+            with open(vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            # rewrite the index if it has lines without a vector, otherwise just append to it
+            rewrite = self._index_lines > len(self._rows)
+            with open(f"{self.folder}/index", "w" if rewrite else "a") as f:
+                f.writelines(h + "\n" for h in (list(self._rows) if rewrite else []) + list(new))
+                f.flush()
+                self._index_size = f.tell()
+            for h in new:
+                self._rows[h] = len(self._rows)
+            self._index_lines = len(self._rows)
@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+'''
+Lexical (keyword) index over the stored chunks, ranked with BM25. Finds chunks that share exact terms with the query,
+such as paper names, acronyms and symbols, which vector search can miss. Backed by an SQLite FTS5 inverted index,
+so it is persisted and updated incrementally as chunks are stored and deleted.
+'''
+
+LEXICAL_INDEX_PATH = "vectordata/lexical.sqlite3"
+
+def tokenize(text:str) -> list:
+    """
+    Split text into lowercase word tokens, the same way the index does.
+    """
+    return re.findall(r"\w+", text.lower())
+
+def reciprocal_rank_fusion(rankings, k=60) -> list:
+    """
+    Fuse several ranked lists of IDs into one. Each ID scores 1/(k + rank) for every list it appears in.
+    Returns the IDs sorted by fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class LexicalIndex:
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            # chunk_ids maps our chunk IDs to FTS rowids, so single chunks can be replaced without scanning the index
+            self._connection.execute("CREATE TABLE IF NOT EXISTS chunk_ids (rowid INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE)")
+            self._connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(content, tokenize='unicode61')")
+            self._connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vocab USING fts5vocab(chunks, row)")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM chunk_ids").fetchone()[0]
+
+    def add(self, chunk_ids, texts):
+        """
+        Index chunks, replacing any that are already indexed under the same ID.
+        """
+        with self._lock, self._connection:
+            for chunk_id, text in zip(chunk_ids, texts):
+                self._connection.execute("INSERT OR IGNORE INTO chunk_ids (chunk_id) VALUES (?)", (chunk_id,))
+                rowid = self._connection.execute("SELECT rowid FROM chunk_ids WHERE chunk_id = ?", (chunk_id,)).fetchone()[0]
+                self._connection.execute("DELETE FROM chunks WHERE rowid = ?", (rowid,))
+                self._connection.execute("INSERT INTO chunks (rowid, content) VALUES (?, ?)", (rowid, text))
+
+    def remove(self, chunk_ids):
+        with self._lock, self._connection:
+            for chunk_id in chunk_ids:
+                row = self._connection.execute("SELECT rowid FROM chunk_ids WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    self._connection.execute("DELETE FROM chunks WHERE rowid = ?", row)
+                    self._connection.execute("DELETE FROM chunk_ids WHERE rowid = ?", row)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM chunks")
+            self._connection.execute("DELETE FROM chunk_ids")
+
+    def document_frequencies(self, terms) -> dict:
+        """
+        Get the number of indexed chunks containing each term. Terms in no chunk are left out.
+        """
+        terms = list(set(terms))
+        frequencies = {}
+        with self._lock:
+            for i in range(0, len(terms), 500): # stay under SQLite's limit on query parameters
+                batch = terms[i:i+500]
+                rows = self._connection.execute(
+                    f"SELECT term, doc FROM chunks_vocab WHERE term IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall()
+                frequencies.update(rows)
+        return frequencies
+
+    def search(self, query:str, N=5, chunk_ids=None) -> list:
+        """
+        Get the top N (chunk ID, BM25 score) pairs for chunks containing any of the query's terms, best first.
+        If chunk_ids is given, only those chunks are searched.
+        """
+        terms = set(tokenize(query))
+        if not terms or chunk_ids is not None and not chunk_ids:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        sql = "SELECT chunk_ids.chunk_id, bm25(chunks) FROM chunks JOIN chunk_ids ON chunk_ids.rowid = chunks.rowid WHERE chunks MATCH ?"
+        parameters = [match]
+        if chunk_ids is not None:
+            sql += " AND chunk_ids.chunk_id IN (SELECT value FROM json_each(?))"
+            parameters.append(json.dumps(list(chunk_ids)))
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY bm25(chunks) LIMIT ?", (*parameters, N)).fetchall()
+        return [(chunk_id, -score) for chunk_id, score in rows] # FTS5 scores are negated BM25, lower is better
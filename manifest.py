@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from pdf_parser import file_hash
+from shards import MAIN_SHARD
+
+'''
+Keeps track of what has been stored in ChromaDB. For every source file it records the file's content hash,
+size and mtime, the IDs of its chunks and the settings used to split it, so that re-ingesting a folder
+only has to embed new or changed files and can delete the chunks of changed or removed ones.
+It also holds each source's tags, when it was stored, which searches can filter on, and the shard it is stored in.
+'''
+
+MANIFEST_PATH = "vectordata/manifest.json"
+LEGACY_STORED_PATH = "vectordata/stored" # old list of stored file names, imported once and then ignored
+VERSION_PATH = "vectordata/version" # corpus version, bumped on every store or delete so caches know to drop their entries
+
+def load_manifest() -> dict:
+    """
+    Load the manifest, a dict of source file name -> entry.
+    """
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)["sources"]
+    manifest = {}
+    if os.path.exists(LEGACY_STORED_PATH):
+        # we don't know their hashes or chunks, so they are treated as changed and re-indexed on the next store
+        with open(LEGACY_STORED_PATH, "r") as f:
+            for line in f:
+                manifest[line.rstrip("\n")] = {"hash": None, "size": None, "mtime_ns": None, "chunk_ids": [], "settings": None}
+    return manifest
+
+def save_manifest(manifest:dict):
+    """
+    Write the manifest to disk. Written to a temporary file first, so a crash never leaves half a manifest.
+    """
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with open(MANIFEST_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "sources": manifest}, f)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+
+_version = (None, 0) # (mtime of VERSION_PATH, version) last read, so checking the version is just a stat
+
+def corpus_version() -> int:
+    """
+    Get the corpus version. Shared through a file, so a store or delete in another process is noticed too.
+    """
+    global _version
+    try:
+        mtime = os.stat(VERSION_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    if mtime != _version[0]:
+        with open(VERSION_PATH, "r") as f:
+            _version = (mtime, int(f.read() or 0))
+    return _version[1]
+
+def bump_corpus_version() -> int:
+    """
+    Mark the corpus as changed. Call this after anything is stored in or deleted from the collection.
+    """
+    version = corpus_version() + 1
+    os.makedirs(os.path.dirname(VERSION_PATH), exist_ok=True)
+    with open(VERSION_PATH + ".tmp", "w") as f:
+        f.write(str(version))
+    os.replace(VERSION_PATH + ".tmp", VERSION_PATH)
+    global _version
+    _version = (os.stat(VERSION_PATH).st_mtime_ns, version)
+    return version
+
+def delete_manifest():
+    for path in (MANIFEST_PATH, LEGACY_STORED_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+def source_status(manifest:dict, file_name:str, settings:dict) -> str:
+    """
+    Compare a file against its manifest entry. Returns "new", "changed" or "unchanged".
+    Files whose size and mtime match are unchanged without being read. Otherwise the content hash decides,
+    so touching a file without editing it does not re-index it.
+    """
+    entry = manifest.get(file_name)
+    if entry is None:
+        return "new"
+    if entry["settings"] != settings:
+        return "changed"
+    stat = os.stat(file_name)
+    if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return "unchanged"
+    if entry["hash"] == file_hash(file_name):
+        entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        return "unchanged"
+    return "changed"
+
+def make_entry(file_name:str, chunk_ids:list, settings:dict, tags=(), stored_at=None, shard=MAIN_SHARD, key=None) -> dict:
+    """
+    key is the source key in the IDs of the chunks, see chunking.source_key(). Entries from before it was kept have none.
+    """
+    stat = os.stat(file_name)
+    return {
+        "hash": file_hash(file_name),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_ids": list(chunk_ids),
+        "settings": settings,
+        "tags": list(tags),
+        "stored_at": time.time() if stored_at is None else stored_at,
+        "shard": shard,
+        "key": key,
+    }
+
+def source_shard(entry:dict) -> str:
+    """
+    Get the shard a source is stored in. Entries from before sharding are in the main shard.
+    """
+    return entry.get("shard") or MAIN_SHARD
+
+def stored_at(entry:dict) -> float:
+    """
+    Get when a source was stored, as a timestamp. Entries from before this was recorded use the file's mtime.
+    """
+    return entry.get("stored_at") or (entry["mtime_ns"] or 0) / 1e9
+
+def stale_chunk_ids(manifest:dict, file_name:str, new_chunk_ids=()) -> list:
+    """
+    Get the chunk IDs of file_name's current entry that can be deleted once it is replaced by new_chunk_ids.
+    IDs still used by another source are kept, since identical chunks share an ID.
+    """
+    entry = manifest.get(file_name)
+    if entry is None:
+        return []
+    stale = set(entry["chunk_ids"]) - set(new_chunk_ids)
+    if stale:
+        stale -= shared_chunk_ids(manifest, file_name)
+    return list(stale)
+
+def shared_chunk_ids(manifest:dict, file_name:str) -> set:
+    """
+    Get the chunk IDs used by every source other than file_name.
+    """
+    shared = set()
+    for source, entry in manifest.items():
+        if source != file_name:
+            shared.update(entry["chunk_ids"])
+    return shared
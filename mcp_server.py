@@ -1,12 +1,75 @@
 from fastmcp import FastMCP
+from starlette.responses import JSONResponse
 import os
-from vector import *
-import spire.doc
-import markdown_pdf
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from doc_service import * # index and searches are served by the document service
+from document_reader import read_stored_document, MAX_CHARS
+from vector import search_filters # builds the filters, the searches themselves go through the document service
+from converters import convert_markdown, document_lock
 
 mcp = FastMCP("Bernhard")
 
+'''
+Tools are served asynchronously: blocking work runs in bounded pools, so one slow call does not stall other clients.
+File reads, PDF parsing and searches run in a thread pool, document conversion in a process pool.
+Each tool has its own concurrency limit and a timeout. Tools that change the library run one at a time,
+and a created document is never written and converted at the same time.
+Cancelled and timed out requests stop waiting for their work, but keep its slot until it finishes.
+'''
+
+IO_WORKERS = int(os.getenv("MCP_IO_WORKERS", 8))   # threads for file reads, PDF parsing and searches
+CPU_WORKERS = int(os.getenv("MCP_CPU_WORKERS", 2)) # processes for document conversion
+TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", 120)) # seconds before a tool call gives up
+DEFAULT_TOOL_LIMIT = 8 # concurrent calls per tool, unless listed below
+TOOL_LIMITS = {
+    "get_full_document": 4,
+    "convert_markdown_document": CPU_WORKERS,
+}
+# tools that change the library share one slot, so writes never run at the same time, even across tools
+WRITE_TOOLS = {"remove_document_from_library", "reindex_document", "tag_document"}
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="mcp-io")
+cpu_pool = None # started on the first conversion
+write_slots = asyncio.Semaphore(1)
+
+def release_when_done(slots, future):
+    slots.release()
+    if not future.cancelled():
+        future.exception() # retrieved so a failure after a timeout is not reported as never retrieved
+
+async def run_blocking(name, executor, slots, function, *args, timeout=TOOL_TIMEOUT):
+    """
+    Run a blocking function in executor within slots, returning an error message instead of its result if it times out.
+    The slot is held until the function returns, also after a timeout or a cancelled request, since the work keeps running.
+    """
+    await slots.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args))
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(functools.partial(release_when_done, slots))
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout) # shielded, so the slot is not released early
+    except asyncio.TimeoutError:
+        return f"{name} timed out after {timeout:.0f}s, try again with a smaller request."
+
+def offload(function):
+    """
+    Turn a blocking tool function into an async one that runs in the thread pool, within its tool's concurrency limit.
+    """
+    name = function.__name__
+    slots = write_slots if name in WRITE_TOOLS else asyncio.Semaphore(TOOL_LIMITS.get(name, DEFAULT_TOOL_LIMIT))
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(name, io_pool, slots, functools.partial(function, *args, **kwargs))
+    return wrapper
+
 @mcp.tool
+@offload
 def get_document_names():
     """
     Get the names of all stored documents.
@@ -17,48 +80,167 @@ def get_document_names():
     return names
 
 @mcp.tool
-def get_full_document(document_name:str):
+@offload
+def get_document_catalog():
+    """
+    Get an overview of every stored document in one call: its name, number of pages, section outline, key terms,
+    and lead section (usually the abstract). Use this to find which documents cover a topic before reading any of them.
+    Returns:
+        list: One profile per document, with document, pages, chars, outline (section titles and their pages), key_terms, lead, tags and stored_at.
+    """
+    return document_catalog()
+
+@mcp.tool
+@offload
+def get_full_document(document_name:str, cursor:str = "chars:0-", max_chars: int = MAX_CHARS):
     """
-    Get the full text of a document by its name. Call get_document_names() to input the exact name.
+    Get the text of a document by its name, at most max_chars characters at a time. Call get_document_names() to input the exact name.
+    If the document is longer, call again with cursor set to the returned next_cursor to continue reading.
+    Prefer semantic_search() or get_document_pages() when only parts of the document are needed.
     Args:
         str: The document name from get_document_names() list.
+        str: Where to start reading, the next_cursor of the previous call. Defaults to the start of the document.
+        int: The most characters to return.
     Returns:
-        str|list: The full text of the document if the document is a txt. If it is a pdf, a list of strings, each representing a page.
+        dict: The document name, its number of pages and the range read, with its text and next_cursor (null once the end is reached).
     """
-    if document_name.endswith('.txt'):
-        with open(f"{DOCUMENT_FOLDER}/{document_name}", 'r') as f:
-            return f.read()
-    elif document_name.endswith('.pdf'):
-        return extract_pdf(f"{DOCUMENT_FOLDER}/{document_name}")
+    return read_stored_document(document_name, [cursor], max_chars)
 
 @mcp.tool
-def get_document_page(document_name:str, page_number:int):
+@offload
+def get_document_page(document_name:str, page_number: int, max_chars: int = MAX_CHARS):
     """
     Get a specific page of a document by its name. Call get_document_names() to input the exact name.
+    Text documents are split into pages of a few thousand characters.
     Args:
         str: The document name from get_document_names() list.
         int: The page number to retrieve (1-indexed).
+        int: The most characters to return.
     Returns:
-        str|list: The full text of the document if the document is a txt. If it is a pdf, a list of strings, each representing a page.
+        dict: The document name, its number of pages and the page, with its text and next_cursor if it was cut off.
     """
-    if document_name.endswith('.txt'):
-        with open(f"{DOCUMENT_FOLDER}/{document_name}", 'r') as f:
-            return f.read()
-    elif document_name.endswith('.pdf'):
-        return extract_pdf(f"{DOCUMENT_FOLDER}/{document_name}")[page_number-1]
+    return read_stored_document(document_name, [str(page_number)], max_chars)
 
 @mcp.tool
-def semantic_search(query):
+@offload
+def get_document_pages(document_name:str, ranges: list, max_chars: int = MAX_CHARS):
+    """
+    Get several parts of a document in one call. Call get_document_names() to input the exact name.
+    Each range is a page "3", pages "2-4", characters "chars:0-5000", tokens "tokens:0-1000", or a next_cursor from an earlier call.
+    Pages are 1-indexed, text documents are split into pages of a few thousand characters.
+    Args:
+        str: The document name from get_document_names() list.
+        list: The ranges to read, in order.
+        int: The most characters to return, shared by all ranges.
+    Returns:
+        dict: The document name, its number of pages and one entry per range with its text and next_cursor, set when the range did not fit.
+    """
+    return read_stored_document(document_name, ranges, max_chars)
+
+@mcp.tool
+@offload
+def semantic_search(query, sources: list = None, pages: list = None, tags: list = None, stored_after: str = None, stored_before: str = None,
+                    shards: list = None):
     """
     Semantically search for relevant sections of the stored documents based on the query.
+    Sections that contain the exact terms of the query, such as paper names, acronyms or symbols, are also found.
+    The optional filters narrow the search, for example to the documents a question is about.
     Args:
         str: A search query.
+        list: Only search these documents, names from get_document_names().
+        list: Only search these pages, [first, last], numbered like the Page of the results.
+        list: Only search documents with any of these tags, see get_document_catalog().
+        str: Only search documents stored on or after this date, e.g. 2025-03-01.
+        str: Only search documents stored before this date.
+        list: Only search these document groups, the shard of each document in get_document_catalog().
+    Returns:
+        list: Containing sections and metadata regarding its Id, Source, Page, Chunk, and Distance.
+    """
+    return query_content(query, filters=search_filters(sources, pages, tags, stored_after, stored_before, shards))
+
+@mcp.tool
+@offload
+def remove_document_from_library(document_name:str):
+    """
+    Remove a stored document: deletes its file and its sections from the semantic search index. Other documents are untouched.
+    Args:
+        str: The document name from get_document_names() list.
+    Returns:
+        str: How many sections were removed.
+    """
+    if not os.path.isfile(f"{DOCUMENT_FOLDER}/{document_name}"):
+        return f"No documents named {document_name}. Use get_document_names() to find the exact name."
+    n = remove_document(document_name, delete_file=True)
+    return f"Removed {document_name} and {n} sections."
+
+@mcp.tool
+@offload
+def reindex_document(document_name:str):
+    """
+    Re-index a stored document from its current file, replacing its sections in the semantic search index.
+    Args:
+        str: The document name from get_document_names() list.
     Returns:
-        list: Containing sections and metadata regarding its Source, Page, Chunk, and Distance.
+        str: How many sections were stored.
     """
-    return query_content(query)
+    if not os.path.isfile(f"{DOCUMENT_FOLDER}/{document_name}"):
+        return f"No documents named {document_name}. Use get_document_names() to find the exact name."
+    n = replace_document(document_name)
+    return f"Re-indexed {document_name} with {n} sections."
 
 @mcp.tool
+@offload
+def tag_document(document_name:str, tags: list):
+    """
+    Set the tags of a stored document, replacing its previous tags. Searches can be limited to documents with a tag.
+    Args:
+        str: The document name from get_document_names() list.
+        list: The tags, e.g. ["transformers", "survey"].
+    Returns:
+        list: The document's tags.
+    """
+    if not os.path.isfile(f"{DOCUMENT_FOLDER}/{document_name}"):
+        return f"No documents named {document_name}. Use get_document_names() to find the exact name."
+    return set_document_tags(document_name, tags)
+
+@mcp.tool
+@offload
+def semantic_search_batch(queries: list, deduplicate: bool = True, sources: list = None, pages: list = None, tags: list = None,
+                          stored_after: str = None, stored_before: str = None, shards: list = None):
+    """
+    Semantically search for several queries in one call. Use this instead of calling semantic_search() repeatedly,
+    for example to look up each part of a multi-part question. The filters are the same as for semantic_search() and apply to every query.
+    Args:
+        list: A list of search queries.
+        bool: Leave out sections already returned for an earlier query in the list. Defaults to True.
+        list: Only search these documents.
+        list: Only search these pages, [first, last].
+        list: Only search documents with any of these tags.
+        str: Only search documents stored on or after this date.
+        str: Only search documents stored before this date.
+        list: Only search these document groups.
+    Returns:
+        list: One entry per query, with the Query and its Results, each containing a section and metadata regarding its Id, Source, Page, Chunk, and Distance.
+    """
+    return query_content_many(queries, deduplicate=deduplicate, filters=search_filters(sources, pages, tags, stored_after, stored_before, shards))
+
+@mcp.tool
+@offload
+def expand_search_result(chunk_id: str, before: int = 1, after: int = 1):
+    """
+    Get more context around a section found by semantic_search(): the sections just before and after it in the same document.
+    Much cheaper than reading the whole document.
+    Args:
+        str: The Id of a search result.
+        int: How many sections before it to include. Defaults to 1.
+        int: How many sections after it to include. Defaults to 1.
+    Returns:
+        dict: The Source, the Pages covered, the Ids of the sections and their merged Content.
+    """
+    return expand_hit(chunk_id, before, after) or f"No section with Id {chunk_id}, it may have been re-indexed. Search again."
+
+@mcp.tool
+@offload
 def create_document(document_name, markdown_string):
     """
     Create a new document. Documents created must be strictly written in markdown, and are stored as .md files.
@@ -72,11 +254,12 @@ def create_document(document_name, markdown_string):
     if not document_name.endswith('.md'):
         document_name += '.md'
     filename = f"created_documents/{document_name}"
-    with open(filename, 'w') as f:
+    with document_lock(document_name), open(filename, 'w') as f:
         f.write(markdown_string)
     return os.path.abspath(filename)
 
 @mcp.tool
+@offload
 def get_created_documents():
     """
     Get a list of names of all created markdown documents.
@@ -84,6 +267,7 @@ def get_created_documents():
     return [f for f in os.listdir("created_documents") if f.endswith('.md')]
 
 @mcp.tool
+@offload
 def read_created_document(document_name:str):
     """
     Get the content of a created markdown document.
@@ -100,8 +284,15 @@ def read_created_document(document_name:str):
     else:
         return f"Only created markdown documents are supported, found {document_name}."
 
+conversion_slots = asyncio.Semaphore(TOOL_LIMITS["convert_markdown_document"])
+
+def convert_locked(document_name, document_type):
+    # holds the document's lock in an io_pool thread while a cpu_pool process converts it, so it is not rewritten meanwhile
+    with document_lock(document_name):
+        return cpu_pool.submit(convert_markdown, document_name, document_type).result()
+
 @mcp.tool
-def convert_markdown_document(document_name, document_type):
+async def convert_markdown_document(document_name:str, document_type:str):
     """
     Convert a markdown document to another format. Only use this if the client says so.
     Args:
@@ -110,22 +301,22 @@ def convert_markdown_document(document_name, document_type):
     Returns:
         str: The absolute path to the converted document.
     """
-    if not os.path.exists(f"created_documents/{document_name}"):
-        return f"No documents named {document_name}. Use get_created_documents() to find the exact name."
-    if document_type == "pdf":
-        pdf = markdown_pdf.MarkdownPdf()
-        with open(f"created_documents/{document_name}", 'r') as f:
-            pdf.add_section(markdown_pdf.Section(f.read()))
-        pdf.save(f"created_documents/{document_name}.pdf")
-    elif document_type == "docx":
-        document = spire.doc.Document()
-        document.LoadFromFile(f"created_documents/{document_name}", spire.doc.FileFormat.Markdown)
-        document.SaveToFile(f"created_documents/{document_name}.docx", spire.doc.FileFormat.Docx2016)
-    else:
-        return "Unknown type of document, only supports pdf or docx."
-    return os.path.abspath(f"created_documents/{document_name}.{document_type}")
+    global cpu_pool
+    if cpu_pool is None:
+        cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return await run_blocking("convert_markdown_document", io_pool, conversion_slots, convert_locked, document_name, document_type)
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health_check(request):
+    """
+    Health and readiness for process supervisors: 200 once the index and models are loaded, 503 while still starting up.
+    """
+    status = await asyncio.get_running_loop().run_in_executor(io_pool, health)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 if __name__ == "__main__":
+    if os.getenv("EMBEDDING_WARMUP", "1") == "1":
+        threading.Thread(target=warm_up, daemon=True).start() # accept connections right away, /health reports when ready
     mcp.run(
         transport="sse",
         host="127.0.0.1",
@@ -0,0 +1,117 @@
+import os
+import re
+import zlib
+import sqlite3
+import threading
+from hashlib import sha256
+import numpy as np
+
+'''
+Near-duplicate detection for chunks with MinHash signatures over word shingles, looked up through
+locality-sensitive hashing (LSH) bands. Catches chunks that are almost the same, such as a repeated
+header, a boilerplate paragraph or the same text in two versions of a paper, which exact hashing misses.
+Signatures are stored in SQLite, so chunks are compared with everything stored before, across pages and documents.
+'''
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0)) # estimated similarity at which a chunk is dropped, 0 keeps every chunk
+NEAR_DUPLICATE_INDEX_PATH = "vectordata/near_duplicates.sqlite3"
+SHINGLE_WORDS = 5 # words per shingle
+PERMUTATIONS = 64 # length of a signature
+BANDS = 16 # LSH bands, PERMUTATIONS / BANDS rows each
+
+_PRIME = (1 << 61) - 1
+_random = np.random.default_rng(20240601) # fixed seed, signatures must stay comparable across runs
+_A = _random.integers(1, 1 << 31, PERMUTATIONS, dtype=np.uint64)
+_B = _random.integers(0, 1 << 31, PERMUTATIONS, dtype=np.uint64)
+
+def minhash(text:str) -> np.ndarray:
+    """
+    Get the MinHash signature of text's word shingles. The share of equal entries in two signatures
+    estimates the Jaccard similarity of the two texts' shingle sets.
+    """
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i+SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0) # a*x + b stays below 2**63, no overflow
+
+def similarity(signature, other) -> float:
+    return float(np.mean(signature == other))
+
+def _band_hashes(signature) -> list:
+    rows = PERMUTATIONS // BANDS
+    return [int.from_bytes(sha256(signature[i*rows:(i+1)*rows].tobytes()).digest()[:8], "big", signed=True)
+            for i in range(BANDS)]
+
+class NearDuplicateIndex:
+    def __init__(self, path=NEAR_DUPLICATE_INDEX_PATH, threshold=NEAR_DUPLICATE_THRESHOLD):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.threshold = threshold
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS signatures (chunk_id TEXT PRIMARY KEY, signature BLOB)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, hash INTEGER, chunk_id TEXT)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS bands_hash ON bands (band, hash)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS bands_chunk ON bands (chunk_id)")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def find(self, signature, exclude=(), pending=None):
+        """
+        Get the ID of the most similar indexed chunk at or above the threshold, or None. Chunks in exclude are ignored.
+        pending maps the IDs of chunks that are about to be stored, but not indexed yet, to their signatures; they count too.
+        """
+        with self._lock:
+            candidates = set()
+            for band, band_hash in enumerate(_band_hashes(signature)):
+                rows = self._connection.execute("SELECT chunk_id FROM bands WHERE band = ? AND hash = ?", (band, band_hash))
+                candidates.update(chunk_id for chunk_id, in rows)
+            candidates.difference_update(exclude)
+            best, best_similarity = None, self.threshold
+            for chunk_id in candidates:
+                row = self._connection.execute("SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                score = similarity(signature, np.frombuffer(row[0], dtype=np.uint64))
+                if score >= best_similarity:
+                    best, best_similarity = chunk_id, score
+        for chunk_id, other in (pending or {}).items(): # at most a batch, compared directly
+            if chunk_id not in exclude and (score := similarity(signature, other)) >= best_similarity:
+                best, best_similarity = chunk_id, score
+        return best
+
+    def add(self, chunk_ids, signatures):
+        """
+        Index chunks' signatures, replacing any that are already indexed under the same ID, in one transaction.
+        """
+        chunk_ids = list(chunk_ids)
+        signatures = list(signatures)
+        if not chunk_ids:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM bands WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+            self._connection.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?)",
+                                         [(chunk_id, signature.tobytes()) for chunk_id, signature in zip(chunk_ids, signatures)])
+            self._connection.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                                         [(band, band_hash, chunk_id) for chunk_id, signature in zip(chunk_ids, signatures)
+                                          for band, band_hash in enumerate(_band_hashes(signature))])
+
+    def remove(self, chunk_ids):
+        with self._lock, self._connection:
+            for chunk_id in chunk_ids:
+                self._connection.execute("DELETE FROM signatures WHERE chunk_id = ?", (chunk_id,))
+                self._connection.execute("DELETE FROM bands WHERE chunk_id = ?", (chunk_id,))
+
+    def backup(self, path):
+        """
+        Copy the index to a new SQLite file at path, consistent even while it is in use.
+        """
+        target = sqlite3.connect(path)
+        with self._lock, target:
+            self._connection.backup(target)
+        target.close()
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM signatures")
+            self._connection.execute("DELETE FROM bands")
@@ -0,0 +1,374 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from contextlib import contextmanager
+
+'''
+Compact in-process vector index, an alternative to ChromaDB for small and medium libraries (VECTOR_BACKEND=numpy).
+Embeddings are kept in a memory-mapped float16 or int8 matrix and searched exactly, in blocks of rows, so there is
+no HNSW graph to load or build: opening an index is instant and query time only depends on the number of chunks.
+NumpyClient and NumpyCollection implement the part of the ChromaDB client and collection API that vector.py uses.
+
+Each collection gets its own folder with:
+- vectors.f16 or vectors.i8: the embeddings as raw rows, read through a memory map
+- scales.f32: for int8, the scale of each row, an embedding is its int8 row times its scale
+- norms.f32: the squared norm of each row, for L2 distances
+- chunks.sqlite3: the ID table (each chunk's row, document and metadata, with its document name indexed, since
+  most filters are on it), the free rows, and the collection's settings
+Rows of deleted chunks are reused by later ones. Rows are allocated in SQLite, inside the write transaction, so several
+processes can write to a collection. Every write bumps a generation counter, and a process reloads which rows are in
+use whenever the counter changed since it last looked, so searches in one process see the writes of the others.
+'''
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma") # chroma, or numpy to use this index instead
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float16") # float16 or int8, used when an index is created
+SEARCH_BLOCK = 4096 # rows converted to float32 at a time while searching, small enough to stay in the CPU cache
+GROW_ROWS = 4096 # the files grow by at least this many rows, and at least double
+DTYPES = {"float16": (np.float16, "f16"), "int8": (np.int8, "i8")}
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def where_sql(where:dict):
+    """
+    Translate a ChromaDB where clause on metadata into an SQL condition on the chunks table and its parameters.
+    """
+    if "$and" in where or "$or" in where:
+        operator = "$and" if "$and" in where else "$or"
+        parts = [where_sql(condition) for condition in where[operator]]
+        joiner = " AND " if operator == "$and" else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [param for _, params in parts for param in params]
+    (key, condition), = where.items()
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    (operator, value), = condition.items()
+    field, params = ("name", []) if key == "name" else ("json_extract(metadata, ?)", [f'$."{key}"'])
+    if operator in ("$in", "$nin"):
+        negation = "NOT " if operator == "$nin" else ""
+        return f"{field} {negation}IN (SELECT value FROM json_each(?))", params + [json.dumps(list(value))]
+    if operator not in _OPERATORS:
+        raise ValueError(f"Unsupported where operator {operator}")
+    return f"{field} {_OPERATORS[operator]} ?", params + [value]
+
+class NumpyCollection:
+    def __init__(self, folder:str, name="contents", metadata=None, dtype=NUMPY_INDEX_DTYPE):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.name = name
+        self._connection = sqlite3.connect(f"{folder}/chunks.sqlite3", check_same_thread=False, isolation_level=None, timeout=60)
+        self._lock = threading.RLock()
+        self._generation = None # generation the row state below was read at
+        self._dim = None
+        self._size = 0 # rows in use, and free rows below the last one in use
+        self._capacity = 0
+        self._vectors = self._norms = self._scales = None
+        self._live = np.zeros(0, dtype=bool) # whether each row holds a chunk
+        with self._transaction(sync=False):
+            self._connection.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, row INTEGER UNIQUE, name TEXT, document TEXT, metadata TEXT)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_name ON chunks (name)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+            self._connection.execute("INSERT OR IGNORE INTO settings VALUES ('metadata', ?)", (json.dumps(metadata),))
+            self._connection.execute("INSERT OR IGNORE INTO settings VALUES ('dtype', ?)", (dtype,))
+            self._connection.execute("INSERT OR IGNORE INTO settings VALUES ('generation', '0')")
+            settings = dict(self._connection.execute("SELECT key, value FROM settings"))
+            if "size" not in settings: # created before rows were allocated in SQLite
+                size = self._connection.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+                self._connection.execute("INSERT INTO settings VALUES ('size', ?)", (str(size),))
+                self._connection.execute("INSERT INTO free_rows SELECT value FROM json_each(?) WHERE value NOT IN (SELECT row FROM chunks)",
+                                         (json.dumps(list(range(size))),))
+        self.metadata = json.loads(settings["metadata"])
+        self.dtype = settings["dtype"] # an index keeps the dtype it was created with
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unknown NUMPY_INDEX_DTYPE {self.dtype}, use float16 or int8.")
+        with self._lock:
+            self._sync()
+
+    @contextmanager
+    def _transaction(self, sync=True):
+        """
+        Write transaction. BEGIN IMMEDIATE takes SQLite's write lock up front, so writers in other processes wait for it,
+        and with sync the row state is brought up to date under the lock before anything is allocated.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                if sync:
+                    self._sync()
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                self._generation = None # the row state in memory may have changed, read it again
+                raise
+            self._connection.execute("COMMIT")
+
+    def _sync(self):
+        """
+        Reload the row state if it changed since it was read, e.g. by a write in another process. Call with _lock held.
+        """
+        settings = dict(self._connection.execute("SELECT key, value FROM settings WHERE key IN ('generation', 'size', 'dim')"))
+        generation = int(settings["generation"])
+        if generation == self._generation:
+            return
+        if "dim" in settings:
+            self._dim = int(settings["dim"])
+        self._size = int(settings["size"])
+        rows = np.fromiter((row for row, in self._connection.execute("SELECT row FROM chunks")), dtype=np.int64)
+        if self._dim is not None and (self._vectors is None or self._size > self._capacity):
+            self._map(self._size)
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._live[rows] = True
+        self._generation = generation
+
+    def _bump_generation(self):
+        """
+        Tell other processes that rows changed. Call in a write transaction.
+        """
+        self._connection.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+        self._generation += 1
+
+    def _map(self, capacity:int):
+        """
+        Grow the files to hold at least capacity rows, keeping what they hold, and map them.
+        """
+        dtype, suffix = DTYPES[self.dtype]
+        files = [(f"vectors.{suffix}", dtype, (capacity, self._dim)), ("norms.f32", np.float32, (capacity,))]
+        if self.dtype == "int8":
+            files.append(("scales.f32", np.float32, (capacity,)))
+        maps = []
+        for name, file_dtype, shape in files:
+            path = f"{self.folder}/{name}"
+            size = int(np.prod(shape)) * np.dtype(file_dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            maps.append(np.memmap(path, dtype=file_dtype, mode="r+", shape=shape) if capacity else None)
+        self._vectors, self._norms = maps[0], maps[1]
+        self._scales = maps[2] if self.dtype == "int8" else None
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._live = live
+        self._capacity = capacity
+
+    def _allocate(self, n:int) -> list:
+        """
+        Get n free rows, reusing the rows of deleted chunks first and growing the files if needed. Call in a write transaction.
+        """
+        rows = [row for row, in self._connection.execute("SELECT row FROM free_rows ORDER BY row LIMIT ?", (n,))]
+        self._connection.execute("DELETE FROM free_rows WHERE row IN (SELECT value FROM json_each(?))", (json.dumps(rows),))
+        new = n - len(rows)
+        rows.extend(range(self._size, self._size + new))
+        self._size += new
+        self._connection.execute("UPDATE settings SET value = ? WHERE key = 'size'", (str(self._size),))
+        if self._size > self._capacity:
+            self._map(max(self._size, 2 * self._capacity, GROW_ROWS))
+        return rows
+
+    def _write(self, rows, embeddings):
+        if self.dtype == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127
+            scales[scales == 0] = 1
+            vectors = np.round(embeddings / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+            stored = vectors * scales[:, None]
+        else:
+            vectors = embeddings.astype(np.float16)
+            stored = vectors.astype(np.float32)
+        self._vectors[rows] = vectors
+        self._norms[rows] = np.sum(stored * stored, axis=1)
+
+    def _embeddings(self, rows) -> np.ndarray:
+        embeddings = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            embeddings *= self._scales[rows][:, None]
+        return embeddings
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        """
+        Add chunks, replacing any stored under the same ID. Embeddings are required.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._transaction():
+            if self._dim is None:
+                self._dim = embeddings.shape[1]
+                self._connection.execute("INSERT INTO settings VALUES ('dim', ?)", (str(self._dim),))
+                self._map(0)
+            elif embeddings.shape[1] != self._dim:
+                raise ValueError(f"Collection {self.name} holds {self._dim}-dimensional embeddings, not {embeddings.shape[1]}.")
+            existing = dict(self._connection.execute("SELECT id, row FROM chunks WHERE id IN (SELECT value FROM json_each(?))",
+                                                     (json.dumps(list(ids)),)))
+            new_rows = iter(self._allocate(len(set(ids) - set(existing))))
+            rows = {}
+            for chunk_id in ids:
+                if chunk_id not in rows:
+                    rows[chunk_id] = existing[chunk_id] if chunk_id in existing else next(new_rows)
+            row_list = [rows[chunk_id] for chunk_id in ids]
+            self._write(row_list, embeddings) # written before the ID table, so a crash never leaves an ID without its vector
+            self._connection.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", [
+                (chunk_id, row, metadata.get("name"), document, json.dumps(metadata))
+                for chunk_id, row, document, metadata in zip(ids, row_list, documents, metadatas)
+            ])
+            self._live[row_list] = True
+            self._bump_generation()
+
+    add = upsert
+
+    def update(self, ids, metadatas):
+        """
+        Merge new values into the metadata of chunks, like ChromaDB's update.
+        """
+        with self._transaction(sync=False): # rows do not change
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self._connection.execute("SELECT metadata FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    metadata = {**json.loads(row[0]), **metadata}
+                    self._connection.execute("UPDATE chunks SET name = ?, metadata = ? WHERE id = ?", (metadata.get("name"), json.dumps(metadata), chunk_id))
+
+    def delete(self, ids):
+        with self._transaction():
+            ids = json.dumps(list(ids))
+            rows = [row for row, in self._connection.execute("SELECT row FROM chunks WHERE id IN (SELECT value FROM json_each(?))", (ids,))]
+            if not rows:
+                return
+            self._connection.execute("DELETE FROM chunks WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            self._connection.executemany("INSERT INTO free_rows VALUES (?)", [(row,) for row in rows])
+            self._live[rows] = False
+            self._bump_generation()
+
+    def _select(self, columns:str, ids=None, where=None, suffix="", params=()):
+        conditions = []
+        values = []
+        if ids is not None:
+            conditions.append("id IN (SELECT value FROM json_each(?))")
+            values.append(json.dumps(list(ids)))
+        if where:
+            sql, where_values = where_sql(where)
+            conditions.append(sql)
+            values.extend(where_values)
+        query = f"SELECT {columns} FROM chunks" + (" WHERE " + " AND ".join(conditions) if conditions else "") + suffix
+        with self._lock:
+            return self._connection.execute(query, values + list(params)).fetchall()
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None, offset=0):
+        """
+        Get chunks by ID and/or where clause, like ChromaDB's get. include can hold documents, metadatas and embeddings.
+        """
+        suffix, params = "", ()
+        if limit is not None:
+            suffix, params = " ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)
+        chunks = self._select("id, row, document, metadata", ids, where, suffix, params)
+        result = {"ids": [chunk_id for chunk_id, _, _, _ in chunks]}
+        if "documents" in include:
+            result["documents"] = [document for _, _, document, _ in chunks]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(metadata) for _, _, _, metadata in chunks]
+        if "embeddings" in include:
+            with self._lock:
+                self._sync() # the rows may have been written by another process
+                result["embeddings"] = self._embeddings([row for _, row, _, _ in chunks]) if chunks else np.zeros((0, self._dim or 0), dtype=np.float32)
+        return result
+
+    def _distances(self, queries, rows=None) -> np.ndarray:
+        """
+        Squared L2 distances, like ChromaDB's default, from every row (or only rows) to each query. Shape (rows, queries).
+        Rows are converted to float32 one block at a time, so searching never holds the whole matrix in float32.
+        """
+        with self._lock: # the files may be remapped by a concurrent write
+            self._sync()
+            vectors, norms, scales, live, size = self._vectors, self._norms, self._scales, self._live[:self._size].copy(), self._size
+        n = size if rows is None else len(rows)
+        distances = np.empty((n, len(queries)), dtype=np.float32)
+        query_norms = np.sum(queries * queries, axis=1)
+        for start in range(0, n, SEARCH_BLOCK):
+            block = slice(start, min(start + SEARCH_BLOCK, n)) if rows is None else rows[start:start + SEARCH_BLOCK]
+            dots = np.asarray(vectors[block], dtype=np.float32) @ queries.T
+            if scales is not None:
+                dots *= scales[block][:, None]
+            distances[start:start + SEARCH_BLOCK] = norms[block][:, None] - 2 * dots + query_norms
+        if rows is None:
+            distances[~live] = np.inf # free rows
+        return np.maximum(distances, 0, out=distances)
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        """
+        Exact nearest neighbour search, like ChromaDB's query. Returns the ids, documents, distances and metadatas
+        of the n_results closest chunks to each query embedding, closest first.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        results = {"ids": [], "documents": [], "distances": [], "metadatas": []}
+        if where:
+            rows = np.array(sorted(row for row, in self._select("row", where=where)), dtype=np.int64)
+            available = len(rows)
+        else:
+            rows = None
+            available = self.count()
+        k = min(n_results, available)
+        with self._lock:
+            self._sync()
+        if self._dim is None or k == 0:
+            for field in results:
+                results[field] = [[] for _ in queries]
+            return results
+
+        distances = self._distances(queries, rows)
+        top = np.argpartition(distances, k - 1, axis=0)[:k] if k < len(distances) else np.arange(len(distances))[:, None].repeat(len(queries), axis=1)
+        top_rows = []
+        for i in range(len(queries)):
+            order = top[np.argsort(distances[top[:, i], i], kind="stable"), i]
+            top_rows.append([(int(row if rows is None else rows[row]), float(distances[row, i])) for row in order])
+        chunks = {row: (chunk_id, document, metadata) for chunk_id, row, document, metadata in self._select(
+            "id, row, document, metadata", suffix=" WHERE row IN (SELECT value FROM json_each(?))",
+            params=(json.dumps(sorted({row for query_rows in top_rows for row, _ in query_rows})),))}
+        for query_rows in top_rows:
+            query_rows = [(row, distance) for row, distance in query_rows if row in chunks] # deleted while searching
+            results["ids"].append([chunks[row][0] for row, _ in query_rows])
+            results["documents"].append([chunks[row][1] for row, _ in query_rows])
+            results["distances"].append([distance for _, distance in query_rows])
+            results["metadatas"].append([json.loads(chunks[row][2]) for row, _ in query_rows])
+        return results
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+            self._vectors = self._norms = self._scales = None
+
+class NumpyClient:
+    """
+    Stand-in for chromadb.PersistentClient, keeping each collection in path/numpy/<name>.
+    dtype is used for collections it creates.
+    """
+    def __init__(self, path:str, dtype=NUMPY_INDEX_DTYPE):
+        self.path = path
+        self.dtype = dtype
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def get_collection(self, name:str):
+        """
+        Open an existing collection. Raises ValueError if there is none with this name.
+        """
+        with self._lock:
+            if name not in self._collections:
+                if not os.path.exists(f"{self.path}/numpy/{name}"):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = NumpyCollection(f"{self.path}/numpy/{name}", name, None, self.dtype)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name:str, metadata=None):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyCollection(f"{self.path}/numpy/{name}", name, metadata, self.dtype)
+            return self._collections[name]
+
+    def delete_collection(self, name:str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(f"{self.path}/numpy/{name}", ignore_errors=True)
@@ -1,17 +1,179 @@
-import PyPDF2
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os
+import threading
+from hashlib import sha256
+
+'''
+Extracts page text from PDFs. Pages are extracted lazily, one at a time, and cached on disk,
+one file per page, in a folder named after the PDF's content hash, so each page only has to be parsed once.
+'''
+
+PAGE_CACHE_FOLDER = "vectordata/pages"
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2") # pypdf2, or pymupdf (faster, pip install pymupdf)
+FALLBACK_BACKEND = "pypdf2" # used when the main backend fails or times out on a page
+PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", 30)) # seconds allowed to extract one page, 0 for no limit
+
+class PyPDF2Backend:
+    def __init__(self, filename):
+        import PyPDF2 # imported on first use, most pages come from the cache
+        self.reader = PyPDF2.PdfReader(filename)
+
+    def __len__(self):
+        return len(self.reader.pages)
+
+    def extract(self, page_index) -> str:
+        return self.reader.pages[page_index].extract_text()
+
+class PyMuPDFBackend:
+    def __init__(self, filename):
+        import fitz # optional dependency, only needed for this backend
+        self.document = fitz.open(filename)
+
+    def __len__(self):
+        return self.document.page_count
+
+    def extract(self, page_index) -> str:
+        return self.document[page_index].get_text()
+
+BACKENDS = {
+    "pypdf2": PyPDF2Backend,
+    "pymupdf": PyMuPDFBackend,
+}
+
+_hashes = {} # (path, size, mtime) -> content hash, so unchanged files are not re-hashed
+
+def file_hash(filename) -> str:
+    """
+    Get the sha256 hash of a file's content.
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if key not in _hashes:
+        digest = sha256()
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+def _write_file(path, content):
+    """
+    Write to a temporary file first and then rename it, so concurrent readers never see a half-written file.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def _call_with_timeout(function, timeout, *args):
+    """
+    Run function(*args), raising TimeoutError if it takes longer than timeout seconds.
+    The call keeps running in a daemon thread, it just stops being waited for.
+    """
+    if not timeout:
+        return function(*args)
+    result = {}
+    def run():
+        try:
+            result["value"] = function(*args)
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"took longer than {timeout}s")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+class PdfDocument:
+    """
+    Lazy, random-access view over the pages of a PDF.
+    len() gives the page count, doc[i] extracts only page i (0-indexed) and iterating streams the pages one by one.
+    Extracted pages are cached on disk, so later accesses are a single file read.
+    """
+    def __init__(self, filename, backend=PDF_BACKEND, page_timeout=PAGE_TIMEOUT):
+        self.filename = filename
+        self.backend = backend
+        self.page_timeout = page_timeout
+        self.folder = f"{PAGE_CACHE_FOLDER}/{file_hash(filename)}"
+        self._readers = {} # backend name -> opened backend, opened on the first cache miss
+        self._count = None
+
+    def _reader(self, backend):
+        if backend not in self._readers:
+            try:
+                self._readers[backend] = BACKENDS[backend](self.filename)
+            except ImportError as e:
+                if backend == FALLBACK_BACKEND:
+                    raise
+                print(f"PDF backend {backend} is not available ({e}), using {FALLBACK_BACKEND}...")
+                self._readers[backend] = self._reader(FALLBACK_BACKEND)
+        return self._readers[backend]
+
+    def __len__(self):
+        if self._count is None:
+            try:
+                with open(f"{self.folder}/count", "r") as f:
+                    self._count = int(f.read())
+            except FileNotFoundError:
+                self._count = len(self._reader(self.backend))
+                os.makedirs(self.folder, exist_ok=True)
+                _write_file(f"{self.folder}/count", str(self._count))
+        return self._count
+
+    def _extract(self, page_index) -> str:
+        backends = [self.backend] if self.backend == FALLBACK_BACKEND else [self.backend, FALLBACK_BACKEND]
+        for backend in backends:
+            try:
+                return _call_with_timeout(self._reader(backend).extract, self.page_timeout, page_index)
+            except Exception as e:
+                print(f"Failed to extract page {page_index} of {self.filename} with {backend}: {e}")
+                self._readers.pop(backend, None) # the reader may still be busy in a timed out thread, open a new one next time
+        return None
+
+    def __getitem__(self, page_index) -> str:
+        count = len(self)
+        if page_index < 0:
+            page_index += count
+        if not 0 <= page_index < count:
+            raise IndexError(f"{self.filename} has {count} pages, page index {page_index} is out of range")
+        path = f"{self.folder}/{page_index}.txt"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        text = self._extract(page_index)
+        if text is None: # every backend failed, don't cache so it is retried next time
+            return ""
+        _write_file(path, text)
+        return text
+
+    def __iter__(self):
+        for page_index in range(len(self)):
+            yield self[page_index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._readers.clear()
 
 # returns a list of strings, each item is page content
 def extract_pdf(filename) -> list:
-    pages = []
-    with open(filename, "rb") as file:
-        reader = PyPDF2.PdfReader(file)
-        for i, page in enumerate(reader.pages):
-            pages.append(page.extract_text())
-    return pages
+    with PdfDocument(filename) as document:
+        return list(document)
+
+def extract_pdf_page(filename, page_index) -> str:
+    """
+    Get the text of a single page (0-indexed), without extracting the rest of the PDF.
+    """
+    with PdfDocument(filename) as document:
+        return document[page_index]
 
 if __name__ == '__main__':
-    for page in extract_pdf('documents/dynamicfunc.pdf'):
+    for page in PdfDocument('documents/dynamicfunc.pdf'):
         print("="*80)
         print(page)
-        print("="*80)
\ No newline at end of file
+        print("="*80)
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+'''
+Import-time profile of the project's modules. Each module is imported in a fresh interpreter with -X importtime,
+and the total import time and the slowest imports it pulls in are reported.
+
+    python profile_startup.py [module ...]
+'''
+
+MODULES = ["pdf_parser", "chunking", "vector", "doc_service", "agent_tools", "agent_core", "mcp_server"]
+
+def profile_import(module):
+    """
+    Import module in a fresh interpreter. Returns (total seconds, [(seconds, imported module)] sorted slowest first),
+    or None and the error if the import failed.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    imports = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative) / 1e6, name.rstrip()))
+        if name.strip() == module:
+            total = int(cumulative) / 1e6
+    return total, sorted(imports, reverse=True)
+
+if __name__ == "__main__":
+    for module in sys.argv[1:] or MODULES:
+        total, imports = profile_import(module)
+        print("="*80)
+        if total is None:
+            print(f"{module}: failed to import, {imports}")
+            continue
+        print(f"{module}: {total:.3f}s")
+        print("-"*80)
+        for seconds, name in [i for i in imports if i[1].strip() != module][:10]:
+            print(f"{seconds:8.3f}s {name}")
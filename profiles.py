@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from lexical import tokenize
+from chunking import heading
+from document_reader import open_document
+
+'''
+Compact per-document profiles, built when a document is stored: page count, section outline, key terms and
+a lead section (the abstract, if one is found). They are kept together in one catalog file, so an agent can
+see what every document is about in one cheap call instead of reading the documents.
+'''
+
+CATALOG_PATH = "vectordata/catalog.json"
+DOCUMENT_PROFILES = os.getenv("DOCUMENT_PROFILES", "1") == "1" # whether storing a document also builds its profile
+KEY_TERMS = 15 # key terms kept per document
+OUTLINE_SIZE = 40 # headings kept per document
+LEAD_CHARS = 1200 # length of the lead section
+
+STOPWORDS = set("""
+a about above after again all also an and any are as at be been before being below between both but by can could did do
+does doing down during each et etc few for from further had has have having he her here hers him his how however i if in
+into is it its itself just may me might more most must my no nor not now of off on once only or other our ours out over
+own per same she should so some such than that the their theirs them then there these they this those through thus to too
+under until up upon us use used using very via was we were what when where which while who whom why will with within
+without would you your yours al fig figure table section eq equation paper papers show shows shown based given since
+one two three first second new different well many much
+""".split())
+
+_ABSTRACT = re.compile(r"abstract\b[\s.:—-]*", re.IGNORECASE) # at the start of a line
+
+_lock = threading.Lock() # catalog updates are read-modify-write
+
+def outline(pages) -> list:
+    """
+    Get the headings of a document, with the page (1-indexed) each is on.
+    """
+    headings = []
+    for page_number, page in enumerate(pages, start=1):
+        for line in page.splitlines():
+            title = heading(line)
+            if title and (not headings or headings[-1]["title"] != title):
+                headings.append({"title": title, "page": page_number})
+                if len(headings) == OUTLINE_SIZE:
+                    return headings
+    return headings
+
+def lead_section(pages) -> str:
+    """
+    Get the abstract, or the start of the document if it has none, cut at a sentence end near LEAD_CHARS.
+    """
+    lines = "\n".join(pages[:2]).splitlines() # the abstract is near the start
+    lead = []
+    for i, line in enumerate(lines):
+        match = _ABSTRACT.match(line.strip())
+        if match:
+            lead = [line.strip()[match.end():]]
+            for line in lines[i+1:]:
+                if heading(line):
+                    break
+                lead.append(line)
+            break
+    lead = " ".join(" ".join(lead or lines).split())
+    if len(lead) <= LEAD_CHARS:
+        return lead
+    lead = lead[:LEAD_CHARS]
+    end = lead.rfind(". ")
+    return lead[:end + 1] if end > LEAD_CHARS // 2 else lead + "..."
+
+def key_terms(text:str, document_frequencies=None, total_chunks=0, n=KEY_TERMS) -> list:
+    """
+    Get the n terms that best characterise text: frequent in it, rare in the rest of the corpus (TF-IDF).
+    document_frequencies(terms) gives the number of chunks containing each term, see LexicalIndex.document_frequencies.
+    """
+    counts = Counter(term for term in tokenize(text) if len(term) > 2 and not term.isdigit() and term not in STOPWORDS)
+    frequencies = document_frequencies(list(counts)) if document_frequencies and total_chunks else {}
+    scores = {term: count * math.log((1 + total_chunks) / (1 + frequencies.get(term, 0))) if frequencies else count
+              for term, count in counts.items()}
+    return sorted(scores, key=scores.get, reverse=True)[:n]
+
+def build_profile(file_name:str, lexical_index=None) -> dict:
+    """
+    Build the profile of a stored document. With lexical_index, key terms are weighted by how rare they are in the corpus.
+    """
+    with open_document(file_name) as document:
+        pages = list(document) # pages are cached on disk after ingestion, so this is cheap
+    text = "\n".join(pages)
+    return {
+        "document": os.path.basename(file_name),
+        "pages": len(pages),
+        "chars": len(text),
+        "outline": outline(pages),
+        "key_terms": key_terms(
+            text,
+            lexical_index.document_frequencies if lexical_index is not None else None,
+            len(lexical_index) if lexical_index is not None else 0,
+        ),
+        "lead": lead_section(pages),
+    }
+
+def load_catalog() -> dict:
+    """
+    Load the catalog, a dict of source file name -> profile.
+    """
+    if not os.path.exists(CATALOG_PATH):
+        return {}
+    with open(CATALOG_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_catalog(catalog:dict):
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    with open(CATALOG_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(catalog, f)
+    os.replace(CATALOG_PATH + ".tmp", CATALOG_PATH)
+
+def set_profile(file_name:str, profile:dict):
+    with _lock:
+        catalog = load_catalog()
+        catalog[file_name] = profile
+        save_catalog(catalog)
+
+def remove_profile(file_name:str):
+    with _lock:
+        catalog = load_catalog()
+        if catalog.pop(file_name, None) is not None:
+            save_catalog(catalog)
+
+def rename_profile(old_name:str, new_name:str):
+    with _lock:
+        catalog = load_catalog()
+        if old_name in catalog:
+            catalog[new_name] = {**catalog.pop(old_name), "document": os.path.basename(new_name)}
+            save_catalog(catalog)
+
+def delete_catalog():
+    with _lock:
+        if os.path.exists(CATALOG_PATH):
+            os.remove(CATALOG_PATH)
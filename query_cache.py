@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+'''
+In-process LRU cache for search results. Entries expire after a TTL, and the whole cache is
+dropped whenever the corpus version changes, i.e. whenever something is stored or deleted.
+'''
+
+def normalise_query(query:str) -> str:
+    """
+    Normalise a query so trivially different spellings share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+class QueryCache:
+    def __init__(self, max_size=256, ttl=600):
+        self.max_size = max_size # entries kept before the least recently used one is evicted
+        self.ttl = ttl           # seconds an entry stays valid
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> (time stored, value)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """
+        Get the cached value for key, or None if it is missing, expired or from an older corpus version.
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the hit/miss counters and current size of the cache.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
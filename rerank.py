@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+'''
+Optional second stage for search: a small local cross-encoder rescores the candidates found by vector/hybrid search,
+which puts the most relevant chunks at the top far more reliably than distances alone.
+Scoring stops when the per-query time budget runs out, and then the original order is kept.
+'''
+
+RERANK = os.getenv("RERANK", "0") == "1" # rerank search results by default
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20)) # candidates fetched and rescored to pick the top N
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 8))
+RERANK_BUDGET = float(os.getenv("RERANK_BUDGET", 0.5)) # seconds allowed for rescoring one query
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 10000)) # (query, chunk) scores kept
+
+class Reranker:
+    def __init__(self, model=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, cache_size=RERANK_CACHE_SIZE):
+        self.model_name = model
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._model = None # loaded on first use
+        self._scores = OrderedDict() # (query, chunk hash) -> score, least recently used first
+        self._lock = threading.Lock()
+
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder # optional dependency, only needed when reranking
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def _cached(self, key):
+        with self._lock:
+            if key in self._scores:
+                self._scores.move_to_end(key)
+                return self._scores[key]
+        return None
+
+    def _cache(self, key, score):
+        with self._lock:
+            self._scores[key] = score
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def rerank(self, query:str, results:list, N=5, budget=RERANK_BUDGET):
+        """
+        Rescore results against the query and return (top N results, True).
+        If the budget runs out before every result is scored, returns (first N results in their original order, False).
+        Each reranked result gets a "Rerank Score".
+        """
+        keys = [(query, sha256(result["Content"].encode()).hexdigest()) for result in results]
+        scores = [self._cached(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            self.model() # loading the model does not count against the budget
+        start = time.perf_counter()
+        batch_time = 0.0
+        for b in range(0, len(missing), self.batch_size):
+            if time.perf_counter() - start + batch_time > budget: # the next batch would not finish in time
+                return results[:N], False
+            batch_start = time.perf_counter()
+            batch = missing[b:b+self.batch_size]
+            for i, score in zip(batch, self.model().predict([(query, results[i]["Content"]) for i in batch], batch_size=self.batch_size)):
+                scores[i] = float(score)
+                self._cache(keys[i], scores[i])
+            batch_time = time.perf_counter() - batch_start
+        reranked = []
+        for result, score in sorted(zip(results, scores), key=lambda pair: pair[1], reverse=True)[:N]:
+            reranked.append({**result, "Rerank Score": score})
+        return reranked, True
+
+    def warm_up(self):
+        self.model().predict([("warm up", "warm up")])
@@ -0,0 +1,74 @@
+import os
+import re
+import json
+
+'''
+Splits the vector index into shards, each its own ChromaDB directory with its own collection and near-duplicate index,
+so no single HNSW graph has to hold the whole library and a shard can be rebuilt, backed up or detached on its own.
+
+SHARD_BY picks the shard of a document:
+- none: every document is in the main shard (the original single collection in vectordata)
+- folder: documents in a subfolder of the documents folder, such as documents/<project>/paper.pdf, go to a shard
+  named after the subfolder, documents directly in the documents folder stay in the main shard
+
+Which shard a document was stored in is recorded in the manifest, so searches know which shards to ask.
+A detached shard keeps its documents' manifest entries and profiles in a shard.json file in its directory.
+'''
+
+SHARD_BY = os.getenv("SHARD_BY", "none")
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", 4)) # threads querying shards at once
+MAIN_SHARD = "main"
+MAIN_SHARD_PATH = "vectordata" # where the collection was before sharding, so existing indexes keep working
+SHARDS_PATH = "vectordata/shards"
+SHARD_RECORD = "shard.json"
+
+def shard_name(name:str) -> str:
+    """
+    Make a folder name safe to use as a directory name.
+    """
+    return re.sub(r"[^\w.-]", "_", name).strip(".") or MAIN_SHARD
+
+def shard_of(file_name:str, folder:str) -> str:
+    """
+    Get the shard a document belongs to under the SHARD_BY setting. folder is the documents folder.
+    """
+    if SHARD_BY == "none":
+        return MAIN_SHARD
+    if SHARD_BY != "folder":
+        raise ValueError(f"Unknown SHARD_BY {SHARD_BY}, use none or folder.")
+    parent = os.path.normpath(os.path.dirname(file_name))
+    if parent in (".", os.path.normpath(folder)):
+        return MAIN_SHARD
+    return shard_name(os.path.basename(parent))
+
+def shard_path(shard:str) -> str:
+    return MAIN_SHARD_PATH if shard == MAIN_SHARD else f"{SHARDS_PATH}/{shard}"
+
+def is_detached(shard:str) -> bool:
+    return os.path.exists(os.path.join(shard_path(shard), SHARD_RECORD))
+
+def detached_shards() -> list:
+    if not os.path.isdir(SHARDS_PATH):
+        return []
+    return [shard for shard in sorted(os.listdir(SHARDS_PATH)) if is_detached(shard)]
+
+def save_shard_record(path:str, shard:str, sources:dict, catalog:dict):
+    """
+    Write the manifest entries and profiles of a shard's documents into its directory, see attach_shard() in vector.py.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, SHARD_RECORD + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({"shard": shard, "sources": sources, "catalog": catalog}, f)
+    os.replace(os.path.join(path, SHARD_RECORD + ".tmp"), os.path.join(path, SHARD_RECORD))
+
+def load_shard_record(shard:str) -> dict:
+    """
+    Load the record of a detached shard. Raises ValueError if the shard is not detached.
+    """
+    if not is_detached(shard):
+        raise ValueError(f"There is no detached shard {shard} in {SHARDS_PATH}.")
+    with open(os.path.join(shard_path(shard), SHARD_RECORD), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def delete_shard_record(shard:str):
+    os.remove(os.path.join(shard_path(shard), SHARD_RECORD))
@@ -0,0 +1,37 @@
+import os
+import sys
+from hashlib import sha256
+import pytest
+
+# the modules live at the top of the repository, next to the apps that import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def chroma_library(tmp_path, monkeypatch):
+    """
+    An empty library in tmp_path, indexed in ChromaDB with small deterministic embeddings instead of a model.
+    They stand in for the default model, the one collections made before models were configurable are built with.
+    Skipped when chromadb is not installed.
+    """
+    chromadb = pytest.importorskip("chromadb")
+    import vector
+    from embedding import BatchedEmbeddingFunction, model_key
+
+    class HashEmbedding(BatchedEmbeddingFunction):
+        def embed_batch(self, texts) -> list:
+            return [[byte / 255 for byte in sha256(text.encode()).digest()] for text in texts]
+
+    # vector.py keeps everything under the working directory, and loads its clients and indexes once
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vector, "VECTOR_BACKEND", "chroma")
+    monkeypatch.setattr(vector, "_clients", {})
+    monkeypatch.setattr(vector, "_collections", {})
+    monkeypatch.setattr(vector, "_embedding_function", HashEmbedding(model_key("default")))
+    monkeypatch.setattr(vector, "_embedding_cache", None)
+    monkeypatch.setattr(vector, "_lexical_index", None)
+    monkeypatch.setattr(vector, "_near_duplicate_indexes", {})
+    monkeypatch.setattr(vector, "_stored_shards", (None, [vector.MAIN_SHARD]))
+    vector.query_cache.clear()
+    chromadb.api.client.SharedSystemClient.clear_system_cache() # clients are cached by path, and the path is relative
+    os.makedirs(vector.DOCUMENT_FOLDER)
+    return tmp_path
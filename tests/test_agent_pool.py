@@ -0,0 +1,76 @@
+import threading
+import time
+
+from agent_pool import AgentPool
+
+def builder():
+    built = []
+    def build():
+        built.append(object())
+        return built[-1]
+    return build, built
+
+def test_each_session_keeps_its_own_agent():
+    build, built = builder()
+    pool = AgentPool(build, max_concurrent=2)
+    with pool.session("a") as first:
+        pass
+    with pool.session("b") as other:
+        pass
+    with pool.session("a") as again:
+        pass
+    assert first is again and first is not other and len(built) == 2
+    pool.reset("a")
+    with pool.session("a") as fresh:
+        assert fresh is not first
+    assert pool.stats() == {"sessions": 2, "running": 0, "waiting": 0}
+
+def test_idle_agents_are_dropped():
+    build, built = builder()
+    pool = AgentPool(build, idle_timeout=0)
+    with pool.session("a"):
+        pass
+    time.sleep(0.01)
+    with pool.session("b"):
+        assert pool.stats()["sessions"] == 1 # a was idle for longer than the timeout
+
+def test_requests_wait_in_order_for_a_free_slot():
+    pool = AgentPool(lambda: object(), max_concurrent=1)
+    started = []
+    positions = {}
+    release = threading.Event()
+
+    def request(session_id):
+        with pool.session(session_id, on_wait=lambda position: positions.setdefault(session_id, position)):
+            started.append(session_id)
+            release.wait(5)
+
+    threads = [threading.Thread(target=request, args=(session_id,)) for session_id in ("a", "b", "c")]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05) # queued in this order
+    assert started == ["a"] and pool.stats() == {"sessions": 1, "running": 1, "waiting": 2}
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert started == ["a", "b", "c"]
+    assert positions == {"b": 1, "c": 2}
+
+def test_one_session_runs_one_request_at_a_time():
+    pool = AgentPool(lambda: object(), max_concurrent=2)
+    running = []
+    overlap = []
+
+    def request():
+        with pool.session("a"):
+            overlap.append(len(running))
+            running.append(1)
+            time.sleep(0.02)
+            running.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert overlap == [0, 0, 0]
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+pytest.importorskip("strands")
+import agent_tools
+from strands.tools.executors._executor import ToolExecutor
+
+class Agent:
+    def _observe_cancellation(self):
+        return False
+
+def run(tool_names, monkeypatch):
+    """
+    Execute tool calls with ParallelSafeToolExecutor, with tools that only record when they start and end.
+    """
+    log = []
+
+    async def stream(agent, tool_use, tool_results, *args):
+        log.append(("start", tool_use["toolUseId"]))
+        await asyncio.sleep(0.05 if tool_use["toolUseId"] == "0" else 0.01) # the first call is the slowest
+        log.append(("end", tool_use["toolUseId"]))
+        tool_results.append({"toolUseId": tool_use["toolUseId"], "status": "success", "content": []})
+        yield tool_use["toolUseId"]
+
+    async def execute():
+        tool_uses = [{"toolUseId": str(i), "name": name, "input": {}} for i, name in enumerate(tool_names)]
+        tool_results = []
+        events = [event async for event in agent_tools.ParallelSafeToolExecutor()._execute(Agent(), tool_uses, tool_results, None, None, {})]
+        return events, tool_results
+
+    monkeypatch.setattr(ToolExecutor, "_stream_with_trace", staticmethod(stream))
+    events, tool_results = asyncio.run(execute())
+    assert sorted(result["toolUseId"] for result in tool_results) == [str(i) for i in range(len(tool_names))]
+    return log
+
+def test_parallel_safe_calls_run_together(monkeypatch):
+    log = run(["semantic_search", "get_full_document", "get_document_names"], monkeypatch)
+    assert log[:3] == [("start", "0"), ("start", "1"), ("start", "2")]
+    assert log[-1] == ("end", "0")
+
+def test_writes_never_overtake_earlier_calls(monkeypatch):
+    log = run(["semantic_search", "get_full_document", "create_document", "convert_markdown_document", "read_created_document"], monkeypatch)
+    assert log[:2] == [("start", "0"), ("start", "1")]
+    assert log[2:] == [("end", "1"), ("end", "0"), ("start", "2"), ("end", "2"), ("start", "3"), ("end", "3"), ("start", "4"), ("end", "4")]
@@ -0,0 +1,49 @@
+import time
+import numpy as np
+
+from query_cache import QueryCache, normalise_query
+from answer_cache import AnswerCache, prompt_hash
+
+def test_normalise_query():
+    assert normalise_query("  What is  HNSW?\n") == "what is hnsw?"
+
+def test_query_cache_evicts_the_least_recently_used():
+    cache = QueryCache(max_size=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"
+    cache.put("c", 1, "C")
+    assert cache.get("b", 1) is None and cache.get("a", 1) == "A" and cache.get("c", 1) == "C"
+    assert cache.stats() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "size": 2}
+
+def test_query_cache_drops_entries_of_older_versions_and_expired_ones(monkeypatch):
+    cache = QueryCache(ttl=10)
+    cache.put("a", 1, "A")
+    assert cache.get("a", 2) is None
+    cache.put("a", 2, "A")
+    now = time.monotonic()
+    monkeypatch.setattr("query_cache.time.monotonic", lambda: now + 11)
+    assert cache.get("a", 2) is None
+
+def embed(texts):
+    vectors = {"what is hnsw": [1, 0, 0], "what's hnsw": [0.99, 0.1, 0], "what is bm25": [0, 1, 0]}
+    return [np.array(vectors[text], dtype=np.float32) for text in texts]
+
+def test_answer_cache_returns_the_answer_to_a_similar_question():
+    cache = AnswerCache(embed, threshold=0.95)
+    prompt = prompt_hash("system prompt")
+    cache.store("what is hnsw", prompt, 1, {"answer": "A graph index."})
+    assert cache.lookup("what's hnsw", prompt, 1) == ({"answer": "A graph index."}, "what is hnsw")
+    assert cache.lookup("what is bm25", prompt, 1) is None
+    assert cache.lookup("what's hnsw", prompt_hash("another prompt"), 1) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_answer_cache_drops_answers_of_older_versions_and_evicts():
+    cache = AnswerCache(embed, max_size=1)
+    prompt = prompt_hash("system prompt")
+    cache.store("what is hnsw", prompt, 1, "A")
+    assert cache.lookup("what is hnsw", prompt, 2) is None
+    assert cache.stats()["size"] == 0
+    cache.store("what is hnsw", prompt, 2, "A")
+    cache.store("what is bm25", prompt, 2, "B")
+    assert cache.lookup("what is hnsw", prompt, 2) is None and cache.lookup("what is bm25", prompt, 2) == ("B", "what is bm25")
@@ -0,0 +1,68 @@
+import re
+import pytest
+from document_reader import TextDocument, read_range, read_document, read_stored_document
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "paper.txt"
+    path.write_text("".join(f"line {i:03d} of a paper\n" for i in range(100)), encoding="utf-8") # 2000 characters
+    return str(path)
+
+def read_all(document, cursor, max_chars):
+    """
+    Follow next_cursor to the end, like the agent does. Returns the texts of all calls.
+    """
+    texts = []
+    while cursor is not None:
+        result = read_range(document, cursor, max_chars)
+        texts.append(result["text"])
+        cursor = result["next_cursor"]
+    return texts
+
+def test_text_pages_end_at_line_breaks(text_file):
+    document = TextDocument(text_file, page_chars=500)
+    assert len(document) > 1
+    assert all(page.endswith("\n") for page in document)
+    assert "".join(document) == document.text
+
+@pytest.mark.parametrize("max_chars", [300, 500, 2000, 5000])
+def test_cursors_read_the_whole_document_without_an_empty_call(text_file, max_chars):
+    document = TextDocument(text_file, page_chars=500)
+    texts = read_all(document, "chars:0-", max_chars)
+    assert "".join(texts) == document.text
+    assert all(texts) # with 500 and 2000, the last call ends exactly at the end of the document
+
+def test_char_range_stops_at_its_end(text_file):
+    document = TextDocument(text_file, page_chars=500)
+    result = read_range(document, "chars:450-1000", 300)
+    assert result["text"] == document.text[450:750]
+    assert result["next_cursor"] == "chars:750-1000"
+    assert read_range(document, result["next_cursor"], 300) == {"range": "chars:750-1000", "text": document.text[750:1000], "next_cursor": None}
+
+def test_token_ranges_count_four_characters_per_token(text_file):
+    document = TextDocument(text_file, page_chars=500)
+    assert read_range(document, "tokens:10-20")["text"] == document.text[40:80]
+
+def test_page_range_continues_inside_a_page(text_file):
+    document = TextDocument(text_file, page_chars=500)
+    first = read_range(document, "1-2", 300)
+    assert first["next_cursor"] == "1@300-2"
+    texts = [first["text"]] + read_all(document, first["next_cursor"], 300)
+    pages = re.sub(r"\[Page \d+(, from character \d+)?\]\n", "", "".join(texts))
+    assert pages == document[0] + "\n" + document[1] + "\n"
+
+def test_read_document_shares_max_chars_between_ranges(text_file):
+    result = read_document(text_file, ["chars:0-100", "chars:100-300", "chars:300-400"], max_chars=150)
+    texts = [r["text"] for r in result["ranges"]]
+    assert [len(text) for text in texts] == [100, 50, 0]
+    assert [r["next_cursor"] for r in result["ranges"]] == [None, "chars:150-300", "chars:300-400"]
+
+def test_read_document_reports_bad_ranges(text_file):
+    result = read_document(text_file, ["99", "nonsense"])
+    assert all("error" in r for r in result["ranges"])
+
+def test_read_stored_document_returns_messages_for_the_model(tmp_path, text_file):
+    assert read_stored_document("missing.txt", ["1"], folder=str(tmp_path)).startswith("No documents named")
+    (tmp_path / "notes.md").write_text("# notes")
+    assert read_stored_document("notes.md", ["1"], folder=str(tmp_path)).startswith("Only .pdf and .txt")
+    assert read_stored_document("paper.txt", ["1"], folder=str(tmp_path))["pages"] == 1
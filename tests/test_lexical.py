@@ -0,0 +1,44 @@
+from lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+def index(tmp_path):
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    lexical.add(["a", "b", "c"], [
+        "HNSW graphs index vectors for approximate search.",
+        "BM25 ranks chunks by the terms they share with the query, BM25 weighs rare terms more.",
+        "Vectors and graphs, graphs and vectors, nothing about ranking.",
+    ])
+    return lexical
+
+def test_tokenize_lowercases_words():
+    assert tokenize("BM25, HNSW & co.") == ["bm25", "hnsw", "co"]
+
+def test_bm25_ranks_matching_chunks_best_first(tmp_path):
+    lexical = index(tmp_path)
+    results = lexical.search("bm25 terms", N=5)
+    assert [chunk_id for chunk_id, _ in results] == ["b"]
+    results = lexical.search("hnsw graphs", N=5)
+    assert [chunk_id for chunk_id, _ in results][0] == "a" # the rare term outweighs repeating the common one
+    assert all(score > 0 for _, score in results)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_search_only_in_given_chunks(tmp_path):
+    lexical = index(tmp_path)
+    assert [chunk_id for chunk_id, _ in lexical.search("graphs", chunk_ids=["c"])] == ["c"]
+    assert lexical.search("graphs", chunk_ids=[]) == []
+    assert lexical.search("!!", N=5) == []
+
+def test_add_replaces_and_remove_deletes(tmp_path):
+    lexical = index(tmp_path)
+    lexical.add(["a"], ["Now about quantisation only."])
+    assert len(lexical) == 3
+    assert "a" not in [chunk_id for chunk_id, _ in lexical.search("hnsw")]
+    assert [chunk_id for chunk_id, _ in lexical.search("quantisation")] == ["a"]
+    lexical.remove(["a", "unknown"])
+    assert len(lexical) == 2 and lexical.search("quantisation") == []
+    assert lexical.document_frequencies(["graphs", "vectors", "missing"]) == {"graphs": 1, "vectors": 1}
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]]) == ["b", "a", "c"]
+    fused = reciprocal_rank_fusion([["a", "b"], ["c"]], k=1)
+    assert fused == ["a", "c", "b"] # 1/2, 1/2 and 1/3, ties keep their first appearance
+    assert reciprocal_rank_fusion([]) == []
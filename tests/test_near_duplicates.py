@@ -0,0 +1,35 @@
+import numpy as np
+
+from near_duplicates import NearDuplicateIndex, minhash, similarity
+
+def words(prefix, n=100):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def test_minhash_estimates_jaccard_similarity():
+    text = words("w")
+    assert np.array_equal(minhash(text), minhash(text.upper())) # words are compared in lowercase
+    assert similarity(minhash(text), minhash(text + " w100 w101")) > 0.8
+    assert similarity(minhash(text), minhash(words("x"))) < 0.2
+
+def test_find_returns_the_most_similar_chunk_above_the_threshold(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near.sqlite3"), threshold=0.8)
+    index.add(["a", "b"], [minhash(words("w")), minhash(words("x"))])
+    assert len(index) == 2
+    assert index.find(minhash(words("w") + " w100")) == "a"
+    assert index.find(minhash(words("w") + " w100"), exclude=["a"]) is None
+    assert index.find(minhash(words("y"))) is None
+
+def test_find_compares_pending_signatures(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near.sqlite3"), threshold=0.8)
+    pending = {"c": minhash(words("z"))}
+    assert index.find(minhash(words("z") + " z100"), pending=pending) == "c"
+    assert index.find(minhash(words("z")), exclude=["c"], pending=pending) is None
+
+def test_add_replaces_and_remove_deletes(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near.sqlite3"), threshold=0.8)
+    index.add(["a"], [minhash(words("w"))])
+    index.add(["a"], [minhash(words("x"))])
+    assert len(index) == 1 and index.find(minhash(words("w"))) is None
+    assert index.find(minhash(words("x"))) == "a"
+    index.remove(["a"])
+    assert len(index) == 0 and index.find(minhash(words("x"))) is None
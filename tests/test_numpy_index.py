@@ -0,0 +1,95 @@
+import multiprocessing
+import numpy as np
+import pytest
+
+from numpy_index import NumpyCollection, where_sql
+
+def chunks(prefix, n, dim=8, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    ids = [f"{prefix}:{i}" for i in range(n)]
+    metadatas = [{"name": f"documents/{prefix}.txt", "page_number": i} for i in range(n)]
+    return ids, [f"chunk {i} of {prefix}" for i in range(n)], metadatas, embeddings
+
+def rows(collection):
+    return dict(collection._connection.execute("SELECT id, row FROM chunks"))
+
+def test_where_sql_translates_chroma_filters():
+    assert where_sql({"name": "documents/a.txt"}) == ("name = ?", ["documents/a.txt"])
+    assert where_sql({"page_number": {"$gte": 2}}) == ("json_extract(metadata, ?) >= ?", ['$."page_number"', 2])
+    assert where_sql({"name": {"$in": ["a", "b"]}}) == ("name IN (SELECT value FROM json_each(?))", ['["a", "b"]'])
+    sql, params = where_sql({"$and": [{"name": {"$nin": ["a"]}}, {"page_number": {"$lte": 3}}]})
+    assert sql == "(name NOT IN (SELECT value FROM json_each(?)) AND json_extract(metadata, ?) <= ?)"
+    assert params == ['["a"]', '$."page_number"', 3]
+    with pytest.raises(ValueError):
+        where_sql({"name": {"$contains": "a"}})
+
+def test_where_filters_get_and_query(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    for prefix in ("a", "b"):
+        collection.upsert(*chunks(prefix, 5))
+    where = {"$and": [{"name": {"$in": ["documents/b.txt"]}}, {"page_number": {"$gte": 1}}, {"page_number": {"$lte": 2}}]}
+    assert sorted(collection.get(where=where)["ids"]) == ["b:1", "b:2"]
+    result = collection.query(chunks("a", 1, seed=1)[3], n_results=10, where=where)
+    assert sorted(result["ids"][0]) == ["b:1", "b:2"]
+    assert collection.query(chunks("a", 1, seed=1)[3], n_results=3, where={"name": "documents/c.txt"})["ids"] == [[]]
+
+def test_query_returns_the_exact_nearest_chunks(tmp_path):
+    collection = NumpyCollection(str(tmp_path), dtype="float16")
+    ids, documents, metadatas, embeddings = chunks("a", 50)
+    collection.upsert(ids, documents, metadatas, embeddings)
+    queries = embeddings[[3, 17]] + 0.01
+    result = collection.query(queries, n_results=3)
+    for i, query in enumerate(queries):
+        expected = np.argsort(np.sum((embeddings - query) ** 2, axis=1))[:3]
+        assert result["ids"][i] == [ids[j] for j in expected]
+        assert result["distances"][i] == sorted(result["distances"][i])
+
+def test_int8_rows_are_within_half_a_step_of_the_embeddings(tmp_path):
+    collection = NumpyCollection(str(tmp_path), dtype="int8")
+    ids, documents, metadatas, embeddings = chunks("a", 50, dim=32)
+    embeddings[0] = 0 # an all-zero embedding has no scale to divide by
+    collection.upsert(ids, documents, metadatas, embeddings)
+    stored = collection.get(ids=ids, include=["embeddings"])["embeddings"]
+    order = [ids.index(chunk_id) for chunk_id in collection.get(ids=ids, include=[])["ids"]]
+    steps = np.abs(embeddings[order]).max(axis=1, keepdims=True) / 127
+    assert np.all(np.abs(stored - embeddings[order]) <= steps / 2 + 1e-6)
+    assert collection.query(embeddings[[5]], n_results=1)["ids"] == [["a:5"]]
+    assert NumpyCollection(str(tmp_path), dtype="float16").dtype == "int8" # an index keeps the dtype it was created with
+
+def test_deleted_rows_are_reused(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    collection.upsert(*chunks("a", 10))
+    freed = {row for chunk_id, row in rows(collection).items() if chunk_id in ("a:2", "a:7")}
+    collection.delete(["a:2", "a:7"])
+    collection.upsert(*chunks("b", 3))
+    new_rows = {row for chunk_id, row in rows(collection).items() if chunk_id.startswith("b:")}
+    assert freed < new_rows and max(rows(collection).values()) == 10
+    assert collection.count() == 11
+
+def write_chunks(folder, prefix, batches):
+    collection = NumpyCollection(folder)
+    for batch in range(batches):
+        collection.upsert(*chunks(f"{prefix}{batch}", 20, seed=batch))
+    collection.close()
+
+def test_processes_writing_to_one_collection_get_their_own_rows(tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork")
+    context = multiprocessing.get_context("fork")
+    NumpyCollection(str(tmp_path)).close() # created up front, so the writers only open it
+    writers = [context.Process(target=write_chunks, args=(str(tmp_path), prefix, 5)) for prefix in "abcd"]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(60)
+        assert writer.exitcode == 0
+
+    collection = NumpyCollection(str(tmp_path))
+    assert collection.count() == 4 * 5 * 20
+    assert sorted(rows(collection).values()) == list(range(4 * 5 * 20)) # no row given out twice
+    for prefix in "abcd":
+        for batch in range(5):
+            ids, _, _, embeddings = chunks(f"{prefix}{batch}", 20, seed=batch)
+            stored = collection.get(ids=ids, include=["embeddings"])
+            expected = embeddings[[ids.index(chunk_id) for chunk_id in stored["ids"]]]
+            assert np.allclose(stored["embeddings"], expected, atol=1e-2) # each chunk has its own vector, in float16
@@ -0,0 +1,34 @@
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+import vector
+
+def make_baseline_collection():
+    """
+    Create the contents collection the way the first version of vector.py did: ChromaDB's default embedding function
+    and no metadata. The chunks get embeddings of the test's dimension, so no model is downloaded.
+    """
+    embed = vector.get_embedding_function()
+    collection = chromadb.PersistentClient(path=vector.MAIN_SHARD_PATH).get_or_create_collection(name="contents")
+    texts = ["Sharded indexes keep each graph small.", "Every shard can be rebuilt on its own."]
+    collection.upsert(ids=["a", "b"], documents=texts, embeddings=embed(texts),
+                      metadatas=[{"name": "documents/paper.txt", "chunk_number": i} for i in range(2)])
+    return texts
+
+def test_opens_a_collection_created_by_the_baseline(chroma_library):
+    texts = make_baseline_collection()
+    collection = vector.get_collection()
+    assert collection.count() == 2
+    results = collection.query(query_embeddings=vector.get_embedding_function()(texts[:1]), n_results=1)
+    assert results["ids"] == [["a"]]
+
+def test_resets_a_collection_created_by_the_baseline(chroma_library):
+    make_baseline_collection()
+    vector.reset_collection()
+    assert vector.get_collection().count() == 0
+    assert vector.get_collection().metadata["embedding_model"] == vector.get_embedding_function().key
+
+def test_refuses_a_collection_built_with_another_model(chroma_library):
+    chromadb.PersistentClient(path=vector.MAIN_SHARD_PATH).get_or_create_collection(name="contents", metadata={"embedding_model": "other/model"})
+    with pytest.raises(ValueError):
+        vector.get_collection()
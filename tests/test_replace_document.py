@@ -0,0 +1,26 @@
+import os
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain.text_splitter") # used to split the document
+import vector
+from manifest import file_hash
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def test_replace_document_keeps_tags_and_stored_at(chroma_library):
+    path = f"{vector.DOCUMENT_FOLDER}/paper.txt"
+    write(path, "Sharded indexes keep each graph small.\n\nEvery shard can be rebuilt on its own.")
+    vector.store_content(path, profile=False)
+    vector.set_document_tags("paper.txt", ["review", "shards"])
+    stored_at = vector.load_manifest()[path]["stored_at"]
+
+    write(path, "A new version of the paper, with other chunks.\n\nIt is stored again under the same name.")
+    assert vector.replace_document("paper.txt") > 0
+
+    entry = vector.load_manifest()[path]
+    assert entry["hash"] == file_hash(path)
+    assert entry["tags"] == ["review", "shards"]
+    assert entry["stored_at"] == stored_at
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain.text_splitter") # used to split the documents
+import vector
+from near_duplicates import NearDuplicateIndex
+
+def paragraph(word):
+    return " ".join(f"{word}{i}" for i in range(100)) # under 1000 characters, one chunk each
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+@pytest.fixture
+def near_duplicates(chroma_library, monkeypatch):
+    monkeypatch.setattr(vector, "NEAR_DUPLICATE_THRESHOLD", 0.8)
+    index = NearDuplicateIndex(vector.NEAR_DUPLICATE_INDEX_PATH, threshold=0.8)
+    vector._near_duplicate_indexes[vector.MAIN_SHARD] = index
+    for name, word in [("a.txt", "alpha"), ("b.txt", "beta")]:
+        write(f"{vector.DOCUMENT_FOLDER}/{name}", f"{paragraph(word)}\n\n{paragraph('common')}")
+        vector.store_content(f"{vector.DOCUMENT_FOLDER}/{name}", profile=False)
+    return index
+
+def names(where=None):
+    return sorted(metadata["name"] for metadata in vector.get_collection().get(where=where)["metadatas"])
+
+def test_near_duplicate_chunk_is_stored_once_and_indexed(near_duplicates):
+    manifest = vector.load_manifest()
+    a, b = manifest["documents/a.txt"]["chunk_ids"], manifest["documents/b.txt"]["chunk_ids"]
+    assert len(set(a) & set(b)) == 1 # b reuses a's boilerplate chunk
+    assert names() == ["documents/a.txt", "documents/a.txt", "documents/b.txt"]
+    assert len(near_duplicates) == 3 # signatures of the stored chunks only
+
+def test_removed_document_hands_shared_chunks_to_another(near_duplicates):
+    vector.remove_document("a.txt", delete_file=True)
+
+    assert names() == ["documents/b.txt", "documents/b.txt"]
+    shared = set(vector.load_manifest()["documents/b.txt"]["chunk_ids"])
+    assert set(vector.get_collection().get(include=[])["ids"]) == shared
+    assert len(near_duplicates) == 2
+
+def test_changed_document_hands_chunks_it_no_longer_has_to_another(near_duplicates):
+    write(f"{vector.DOCUMENT_FOLDER}/a.txt", paragraph("gamma"))
+    vector.store_content(f"{vector.DOCUMENT_FOLDER}/a.txt", profile=False)
+
+    assert names() == ["documents/a.txt", "documents/b.txt", "documents/b.txt"]
+
+def test_store_many_suppresses_near_duplicates_across_files(near_duplicates):
+    for name, word in [("c.txt", "gamma"), ("d.txt", "delta")]:
+        write(f"{vector.DOCUMENT_FOLDER}/{name}", f"{paragraph(word)}\n\n{paragraph('shared')}")
+
+    assert vector.store_many(vector.DOCUMENT_FOLDER, workers=1, profile=False) == 3 # one copy of the shared paragraph
+    manifest = vector.load_manifest()
+    assert set(manifest["documents/c.txt"]["chunk_ids"]) & set(manifest["documents/d.txt"]["chunk_ids"])
+    assert len(near_duplicates) == 6
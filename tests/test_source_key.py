@@ -0,0 +1,33 @@
+import os
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain.text_splitter") # used to split the documents
+import vector
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def names():
+    return sorted(metadata["name"] for metadata in vector.get_collection().get()["metadatas"])
+
+def test_renamed_document_keeps_its_chunks_when_the_old_name_is_stored_again(chroma_library):
+    text = "Sharded indexes keep each graph small.\n\nEvery shard can be rebuilt on its own."
+    write("documents/a.txt", text)
+    vector.sync_folder(workers=1, profile=False)
+    key = vector.load_manifest()["documents/a.txt"]["key"]
+
+    os.rename("documents/a.txt", "documents/b.txt")
+    vector.sync_folder(workers=1, profile=False)
+    renamed = vector.load_manifest()["documents/b.txt"]
+    assert renamed["key"] == key # not embedded again
+
+    write("documents/a.txt", text) # same name and content as before the rename
+    vector.sync_folder(workers=1, profile=False)
+    manifest = vector.load_manifest()
+    assert manifest["documents/b.txt"] == renamed
+    assert manifest["documents/a.txt"]["key"] != key
+    assert not set(manifest["documents/a.txt"]["chunk_ids"]) & set(renamed["chunk_ids"])
+    assert names().count("documents/b.txt") == len(renamed["chunk_ids"])
+    assert names().count("documents/a.txt") == len(manifest["documents/a.txt"]["chunk_ids"])
@@ -0,0 +1,38 @@
+import os
+import pytest
+import vector
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(f"{vector.DOCUMENT_FOLDER}/project")
+    for name in ("paper.txt", "project/notes.txt"):
+        open(f"{vector.DOCUMENT_FOLDER}/{name}", "w").close()
+    open("system_prompt.txt", "w").close() # a file next to the documents folder, with a name a document could have
+    return tmp_path
+
+@pytest.mark.parametrize("name, expected", [
+    ("paper.txt", "documents/paper.txt"),
+    ("project/notes.txt", "documents/project/notes.txt"),
+    ("documents/paper.txt", "documents/paper.txt"),
+    ("./documents/paper.txt", "documents/paper.txt"),
+    ("system_prompt.txt", "documents/system_prompt.txt"), # never the file in the working directory
+])
+def test_source_path_maps_names_into_the_documents_folder(library, name, expected):
+    assert vector.source_path(name) == expected
+
+@pytest.mark.parametrize("name", ["../system_prompt.txt", "documents/../../system_prompt.txt", "/etc/passwd", ".", ""])
+def test_source_path_rejects_names_outside_the_documents_folder(library, name):
+    with pytest.raises(ValueError):
+        vector.source_path(name)
+
+def test_source_path_rejects_links_out_of_the_documents_folder(library):
+    os.symlink(os.path.abspath("system_prompt.txt"), f"{vector.DOCUMENT_FOLDER}/prompt.txt")
+    with pytest.raises(ValueError):
+        vector.source_path("prompt.txt")
+
+@pytest.mark.parametrize("name", ["system_prompt.txt", "../system_prompt.txt"])
+def test_remove_document_never_deletes_files_outside_the_documents_folder(library, name):
+    with pytest.raises(ValueError):
+        vector.remove_document(name, delete_file=True)
+    assert os.path.exists("system_prompt.txt")
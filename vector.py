@@ -1,97 +1,878 @@
-import chromadb
-from hashlib import sha256
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import time
+import json
+import threading
+from datetime import datetime
+from hashlib import sha256
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pdf_parser import * # our PDF parser module!
+from chunking import * # splitting files into chunk records
+from manifest import * # what has been stored, and from which version of each file
+from query_cache import QueryCache, normalise_query
+from embedding_cache import EmbeddingCache
+from lexical import LexicalIndex, reciprocal_rank_fusion
+from near_duplicates import NearDuplicateIndex, NEAR_DUPLICATE_THRESHOLD, NEAR_DUPLICATE_INDEX_PATH, minhash
+from rerank import Reranker, RERANK, RERANK_CANDIDATES
+from profiles import DOCUMENT_PROFILES, build_profile, load_catalog, set_profile, remove_profile, rename_profile, delete_catalog
+from shards import * # which shard each document is stored in
+from numpy_index import VECTOR_BACKEND
+import numpy as np
 
 '''
 Responsible for reading, vectorizing file content and storing it in ChromaDB.
+The ChromaDB client, the embedding model and the lexical index are loaded on first use, so importing this module is fast.
+Call warm_up() to load them up front, and health() to check what is loaded.
+With SHARD_BY set, documents are spread over several collections that are searched in parallel, see shards.py.
+With VECTOR_BACKEND=numpy, collections are compact memory-mapped NumPy indexes instead of ChromaDB, see numpy_index.py.
 '''
 
-client = chromadb.PersistentClient(path="vectordata") # path to data storage
-collection = client.get_or_create_collection(name="contents")
 DOCUMENT_FOLDER = "documents"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1)) # processes used to extract and split files
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256)) # chunks embedded and written per upsert
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid") # vector, lexical, or hybrid (both, fused by rank)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20)) # candidates taken from each of vector and lexical search before fusing
+WARMUP = os.getenv("EMBEDDING_WARMUP", "1") == "1" # whether entry points call warm_up() at startup
+reranker = Reranker()
+query_cache = QueryCache(
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", 600)), # seconds
+)
+
+shard_pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS) # searches shards in parallel
+
+_load_lock = threading.RLock()
+_clients = {} # shard -> ChromaDB client
+_collections = {} # shard -> its contents collection
+_embedding_function = None
+_embedding_cache = None
+_lexical_index = None
+_near_duplicate_indexes = {} # shard -> its near-duplicate index
+
+def get_embedding_function():
+    """
+    Get the embedding function configured by the EMBEDDING_* settings, see embedding.py.
+    """
+    global _embedding_function
+    with _load_lock:
+        if _embedding_function is None:
+            from embedding import load_embedding_function
+            _embedding_function = load_embedding_function()
+    return _embedding_function
+
+def get_embedding_cache():
+    global _embedding_cache
+    with _load_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(get_embedding_function().key)
+    return _embedding_cache
+
+def make_client(path:str):
+    """
+    Open the vector store in path with the configured VECTOR_BACKEND.
+    """
+    if VECTOR_BACKEND == "numpy":
+        from numpy_index import NumpyClient
+        return NumpyClient(path)
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND {VECTOR_BACKEND}, use chroma or numpy.")
+    import chromadb
+    return chromadb.PersistentClient(path=path)
+
+def get_client(shard=MAIN_SHARD):
+    with _load_lock:
+        if shard not in _clients:
+            _clients[shard] = make_client(shard_path(shard)) # path to data storage
+    return _clients[shard]
+
+def open_collection(shard=MAIN_SHARD):
+    """
+    Open a shard's contents collection, recording which embedding model it is built with.
+    Raises ValueError if it was built with a different model than the configured one.
+    """
+    from embedding import check_collection_model
+    key = get_embedding_function().key
+    client = get_client(shard)
+    # embeddings are always passed explicitly, so the embedding function is not given to ChromaDB: chromadb 1.x
+    # rejects a custom one on collections persisted with its default, which includes every collection made before
+    # models were configurable. The model is checked against the collection's metadata instead.
+    # The collection is looked up first, since some chromadb versions (0.4.x) overwrite the metadata of an existing
+    # collection in get_or_create_collection, which would make the model check always pass.
+    try:
+        collection = client.get_collection(name="contents")
+    except Exception: # the error for a missing collection differs between chromadb versions
+        collection = client.get_or_create_collection(name="contents", metadata={"embedding_model": key})
+    check_collection_model(collection, key)
+    return collection
+
+def get_collection(shard=MAIN_SHARD):
+    with _load_lock:
+        if shard not in _collections:
+            _collections[shard] = open_collection(shard)
+    return _collections[shard]
+
+def reset_collection(shard=MAIN_SHARD):
+    """
+    Delete all chunks of a shard by dropping its collection and creating it again, which is faster than deleting them.
+    """
+    with _load_lock:
+        get_collection(shard) # make sure it exists
+        get_client(shard).delete_collection(name="contents") # the embedding cache is kept, so storing everything again is fast
+        _collections[shard] = open_collection(shard)
+
+_stored_shards = (None, [MAIN_SHARD]) # (corpus version, shards) last read from the manifest
+
+def stored_shards() -> list:
+    """
+    Get the shards that hold stored documents, which are the ones searched. Re-read only when the corpus changes.
+    """
+    global _stored_shards
+    version = corpus_version()
+    if _stored_shards[0] != version:
+        _stored_shards = (version, sorted({source_shard(entry) for entry in load_manifest().values()}) or [MAIN_SHARD])
+    return _stored_shards[1]
+
+def map_shards(function, shards=None) -> list:
+    """
+    Call function(shard) for each of shards (default: all stored shards), in parallel when there are several.
+    Returns the results in the same order.
+    """
+    shards = stored_shards() if shards is None else list(shards)
+    if len(shards) == 1:
+        return [function(shards[0])]
+    return list(shard_pool.map(function, shards))
+
+def document_shard(file_name:str) -> str:
+    return shard_of(file_name, DOCUMENT_FOLDER)
+
+def get_lexical_index():
+    global _lexical_index
+    with _load_lock:
+        if _lexical_index is None:
+            _lexical_index = LexicalIndex()
+            if len(_lexical_index) == 0 and sum(map_shards(lambda shard: get_collection(shard).count())) > 0: # stored before the lexical index existed
+                _fill_lexical_index(_lexical_index)
+    return _lexical_index
+
+def get_near_duplicate_index(shard=MAIN_SHARD):
+    """
+    Get a shard's near-duplicate index. Every shard has its own, so a document is only ever deduplicated against its own shard.
+    """
+    with _load_lock:
+        if shard not in _near_duplicate_indexes:
+            path = NEAR_DUPLICATE_INDEX_PATH if shard == MAIN_SHARD else f"{shard_path(shard)}/near_duplicates.sqlite3"
+            _near_duplicate_indexes[shard] = NearDuplicateIndex(path)
+        return _near_duplicate_indexes[shard]
+
+def rebuild_lexical_index():
+    """
+    Rebuild the lexical index from every chunk in the collections.
+    """
+    lexical_index = get_lexical_index()
+    lexical_index.clear()
+    _fill_lexical_index(lexical_index)
+
+def _fill_lexical_index(lexical_index, shards=None):
+    print("Building lexical index...")
+    for shard in stored_shards() if shards is None else shards:
+        offset = 0
+        while True:
+            page = get_collection(shard).get(include=["documents"], limit=EMBED_BATCH_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            lexical_index.add(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+def warm_up():
+    """
+    Load the ChromaDB collections, the lexical index and the embedding model (and the reranker, if enabled),
+    and run the models once, so the first request does not pay for it. Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    map_shards(get_collection)
+    get_lexical_index()
+    get_embedding_cache()
+    get_embedding_function().warm_up()
+    if RERANK:
+        reranker.warm_up()
+    elapsed = time.perf_counter() - start
+    print(f"Warmed up in {elapsed:.1f}s")
+    return elapsed
+
+def health() -> dict:
+    """
+    Check what is loaded. ready is True once the main collection, lexical index and embedding model are loaded.
+    Never loads anything itself.
+    """
+    collections = dict(_collections)
+    loaded = {
+        "collection": MAIN_SHARD in collections,
+        "lexical_index": _lexical_index is not None,
+        "embedding_model": _embedding_function is not None,
+    }
+    return {
+        "ready": all(loaded.values()),
+        "loaded": loaded,
+        "chunks": sum(collection.count() for collection in collections.values()) if collections else None,
+        "shards": {shard: collection.count() for shard, collection in collections.items()},
+        "corpus_version": corpus_version(),
+        "query_cache": query_cache.stats(),
+    }
 
-def split_text(content):
+def embed_documents(documents):
     """
-    Split the content into chunks for processing
+    Embed a list of chunks. Chunks embedded before, by the same model, are read from the embedding cache
+    and only the rest are run through the embedding function, in one batch.
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1500,    # max size of each chunk (in characters, not tokens)
-        chunk_overlap=500,  # overlap between chunks
-        separators=["\n\n", "\n", " ", ""]  # splitting priority
-    ) #TODO experiment with these values
-    return splitter.split_text(content)
+    hashes = [sha256(document.encode()).hexdigest() for document in documents]
+    embeddings = get_embedding_cache().get_many(hashes)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        computed = get_embedding_function()([documents[i] for i in missing])
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        get_embedding_cache().put_many([hashes[i] for i in missing], computed)
+    return embeddings
 
-def store_content(file_name:str):
+def upsert_records(records):
+    """
+    Embed and write (id, chunk, metadata) records to their documents' shards, one upsert per shard.
+    """
+    if not records:
+        return
+    records = {record[0]: record for record in records}.values() # upsert rejects duplicate IDs in one call, keep the last one
+    ids, documents, metadatas = zip(*records)
+    embeddings = embed_documents(documents)
+    by_shard = {}
+    for record, embedding in zip(records, embeddings):
+        by_shard.setdefault(document_shard(record[2]["name"]), []).append((*record, embedding))
+    for shard, shard_records in by_shard.items():
+        shard_ids, shard_documents, shard_metadatas, shard_embeddings = zip(*shard_records)
+        get_collection(shard).upsert(ids=list(shard_ids), documents=list(shard_documents), metadatas=list(shard_metadatas),
+                                     embeddings=list(shard_embeddings))
+    get_lexical_index().add(ids, documents)
+    bump_corpus_version()
+
+def delete_chunks(chunk_ids, shard=MAIN_SHARD):
+    """
+    Delete chunks from a shard's collection by ID.
+    """
+    if not chunk_ids:
+        return
+    for i in range(0, len(chunk_ids), EMBED_BATCH_SIZE):
+        get_collection(shard).delete(ids=chunk_ids[i:i+EMBED_BATCH_SIZE])
+    get_lexical_index().remove(chunk_ids)
+    if NEAR_DUPLICATE_THRESHOLD or shard in _near_duplicate_indexes:
+        get_near_duplicate_index(shard).remove(chunk_ids)
+    bump_corpus_version()
+
+def suppress_near_duplicates(records, pending, exclude=(), shard=MAIN_SHARD):
+    """
+    Drop records whose chunk is a near-duplicate of a chunk stored in the same shard or of an earlier record, see near_duplicates.py.
+    Chunks in exclude, such as the previous version of the same file, don't count.
+    The signatures of the records kept are put in pending by chunk ID, and only indexed by index_near_duplicates()
+    once their chunks are upserted; until then, later records are compared with them there.
+    Returns the records to store and the IDs of all chunks of the file, including the stored near-duplicates it reuses.
+    """
+    if not NEAR_DUPLICATE_THRESHOLD:
+        return records, [record[0] for record in records]
+    index = get_near_duplicate_index(shard)
+    kept = []
+    chunk_ids = []
+    for record in records:
+        signature = minhash(record[1])
+        duplicate = index.find(signature, exclude, pending)
+        if duplicate is not None and duplicate != record[0]:
+            chunk_ids.append(duplicate) # the file shares that chunk, so it is kept as long as the file is stored
+            continue
+        pending[record[0]] = signature
+        kept.append(record)
+        chunk_ids.append(record[0])
+    if len(kept) < len(records):
+        print(f"Dropped {len(records) - len(kept)} near-duplicate chunks...")
+    return kept, list(dict.fromkeys(chunk_ids))
+
+def index_near_duplicates(pending, shard=MAIN_SHARD, chunk_ids=None):
+    """
+    Index the signatures in pending of chunks that were upserted, all of them or those in chunk_ids, and remove them from pending.
+    """
+    ids = list(pending) if chunk_ids is None else [chunk_id for chunk_id in chunk_ids if chunk_id in pending]
+    if ids:
+        get_near_duplicate_index(shard).add(ids, [pending.pop(chunk_id) for chunk_id in ids])
+
+def reattribute_chunks(manifest, file_name, chunk_ids, shard=MAIN_SHARD):
+    """
+    Give the chunks among chunk_ids that carry file_name's name, but that another document in the shard still uses,
+    to one of those documents. A near-duplicate chunk is stored once, under the name of the first document that had it,
+    so it has to change hands when that document lets go of it. Its page and position stay those of the first copy.
+    """
+    owners = {}
+    for source, entry in manifest.items():
+        if source != file_name and source_shard(entry) == shard:
+            for chunk_id in entry["chunk_ids"]:
+                owners.setdefault(chunk_id, source)
+    shared = [chunk_id for chunk_id in chunk_ids if chunk_id in owners]
+    updated = False
+    for i in range(0, len(shared), EMBED_BATCH_SIZE):
+        ids = get_collection(shard).get(ids=shared[i:i+EMBED_BATCH_SIZE], where={"name": file_name}, include=[])["ids"]
+        if ids:
+            get_collection(shard).update(ids=ids, metadatas=[{"name": owners[chunk_id]} for chunk_id in ids])
+            updated = True
+    if updated:
+        bump_corpus_version()
+
+def record_stored(manifest, file_name, chunk_ids, settings, key, previous=None):
+    """
+    Point file_name's manifest entry at its new chunks, stored with source key key, deleting the chunks of its previous version.
+    Its tags are kept. previous is the entry of a version that was removed before storing it again,
+    whose tags and stored time are kept instead.
+    """
+    shard = document_shard(file_name)
+    delete_chunks(stale_chunk_ids(manifest, file_name, chunk_ids), shard)
+    reattribute_chunks(manifest, file_name, set(manifest.get(file_name, {"chunk_ids": []})["chunk_ids"]) - set(chunk_ids), shard)
+    if previous:
+        tags, when = previous.get("tags", []), stored_at(previous)
+    else:
+        tags, when = manifest.get(file_name, {}).get("tags", []), None
+    manifest[file_name] = make_entry(file_name, chunk_ids, settings, tags, when, shard=shard, key=key)
+
+def move_shards(manifest, file_names):
+    """
+    Delete the chunks of files stored in another shard than the one they belong to now, e.g. after SHARD_BY changed
+    or a file was moved to another folder, and mark them changed so they are stored again in their new shard.
+    """
+    for file_name in file_names:
+        entry = manifest.get(file_name)
+        if entry is not None and source_shard(entry) != document_shard(file_name):
+            print(f"Moving {file_name} from shard {source_shard(entry)} to {document_shard(file_name)}...")
+            delete_chunks(stale_chunk_ids(manifest, file_name), source_shard(entry))
+            reattribute_chunks(manifest, file_name, entry["chunk_ids"], source_shard(entry))
+            entry.update(chunk_ids=[], settings=None, shard=document_shard(file_name))
+
+def store_profile(file_name:str):
+    """
+    Build and save the profile of a stored document, see profiles.py. A failure is reported but does not fail the ingest.
+    """
+    try:
+        set_profile(file_name, build_profile(file_name, get_lexical_index()))
+    except Exception as e:
+        print(f"Failed to build the profile of {file_name}: {e}")
+
+def store_content(file_name:str, profile=DOCUMENT_PROFILES, previous=None):
     """
     Store the content of a file in ChromaDB. Splits them, vectorizes them, then stores them.
-    Returns the number of chunks stored.
+    A file that was edited since it was stored is re-indexed, an unchanged one is skipped.
+    If profile is set, the document's profile is built too, see document_catalog().
+    previous is passed on to record_stored().
+    Returns the number of chunks stored, or None if the file was already stored.
     """
     print(f"Processing content from {file_name}...")
 
+    shard = document_shard(file_name)
+    if is_detached(shard):
+        raise ValueError(f"{file_name} belongs to shard {shard}, which is detached. Attach it first.")
+    manifest = load_manifest()
+    settings = ingest_settings()
+    move_shards(manifest, [file_name])
+    if source_status(manifest, file_name, settings) == "unchanged":
+        print(f"Content from {file_name} already stored, skipping...")
+        save_manifest(manifest) # may have refreshed its mtime
+        return
+
+    print(f"Splitting content...")
+    key = source_key()
+    pending = {}
+    records, chunk_ids = suppress_near_duplicates(prepare_document(file_name, key), pending, manifest.get(file_name, {}).get("chunk_ids", []), shard)
+    print(f"Storing content...")
+    for i in range(0, len(records), EMBED_BATCH_SIZE):
+        upsert_records(records[i:i+EMBED_BATCH_SIZE])
+    index_near_duplicates(pending, shard)
+
+    record_stored(manifest, file_name, chunk_ids, settings, key, previous)
+    save_manifest(manifest)
+    if profile:
+        store_profile(file_name)
+    return len(records)
+
+def list_documents(folder):
+    """
+    List the paths of all .txt and .pdf files in a folder. With SHARD_BY=folder, the ones in its subfolders too.
+    """
+    file_names = []
+    for name in sorted(os.listdir(folder)):
+        path = f"{folder}/{name}"
+        if name.endswith((".txt", ".pdf")):
+            file_names.append(path)
+        elif SHARD_BY == "folder" and os.path.isdir(path):
+            file_names.extend(f"{path}/{sub}" for sub in sorted(os.listdir(path)) if sub.endswith((".txt", ".pdf")))
+    return file_names
+
+def store_many(sources, workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE, profile=DOCUMENT_PROFILES):
+    """
+    Bulk version of store_content, for a whole folder or a list of files.
+    New and changed files are extracted and split in a pool of worker processes while this process
+    embeds the finished chunks in fixed-size batches and is the only one writing to ChromaDB.
+    Unchanged files, and files of detached shards, are skipped. Returns the number of chunks stored.
+    """
+    file_names = list_documents(sources) if isinstance(sources, str) else list(sources)
+    detached = {shard for shard in {document_shard(f) for f in file_names} if is_detached(shard)}
+    if detached:
+        print(f"Skipping the files of detached shards {', '.join(sorted(detached))}...")
+        file_names = [f for f in file_names if document_shard(f) not in detached]
+    manifest = load_manifest()
+    settings = ingest_settings()
+    move_shards(manifest, file_names)
+    pending = [f for f in file_names if source_status(manifest, f, settings) != "unchanged"]
+    print(f"Storing {len(pending)} files, skipping {len(file_names) - len(pending)} unchanged...")
+    if not pending:
+        save_manifest(manifest)
+        return 0
+
+    start = time.perf_counter()
     numchunks = 0
+    batch = []
+    keys = {file_name: source_key() for file_name in pending} # a new version of each file gets a new key
+    completed = []    # (file name, chunk IDs) of files whose records are all queued, recorded once they are written
+    signatures = {}   # shard -> near-duplicate signatures of queued chunks, indexed once they are written
 
-    if os.path.exists('vectordata/stored'):
-        with open('vectordata/stored', "r") as f:
-            if file_name+'\n' in f.readlines():
-                print(f"Content from {file_name} already stored, skipping...")
-                return
-    else:
-        with open('vectordata/stored', "w") as f:
-            pass
-
-    if file_name.endswith(".txt"):
-        with open(file_name, "r") as f:
-            content = f.read()
-            print(f"Splitting content...")
-            chunks = split_text(content)
-            print(f"Storing content...")
-            chunks = list(set(chunks)) # remove duplicates
-            numchunks += len(chunks)
-            collection.upsert(
-                ids=[sha256(chunk.encode()).hexdigest() for chunk in chunks], # for now just use sha256 for chunk ID
-                documents=[chunk for chunk in chunks],
-                metadatas=[{"name": file_name, "chunk_number": i} for i, _ in enumerate(chunks)] # additional data for each chunk, can put document title, page, section name...
-            )
-    elif file_name.endswith(".pdf"):
-        for page_number, page_content in enumerate(extract_pdf(file_name)):
-            print(f"Splitting content from page {page_number}...")
-            chunks = split_text(page_content)
-            print(f"Storing content from page {page_number}...")
-            chunks = list(set(chunks))
-            numchunks += len(chunks)
-            collection.upsert(
-                ids=[sha256(chunk.encode()).hexdigest() for chunk in chunks], # for now just use sha256 for chunk ID
-                documents=[chunk for chunk in chunks],
-                metadatas=[{"name": file_name, "chunk_number": i, "page_number": page_number} for i, _ in enumerate(chunks)] # additional data for each chunk, can put document title, page, section name...
-            )
-    
-    with open('vectordata/stored', "a") as f: # mark this file as stored, no need to store again.
-        f.write(file_name + "\n")
+    def flush():
+        nonlocal numchunks, batch, completed
+        upsert_records(batch)
+        for shard, shard_signatures in signatures.items():
+            index_near_duplicates(shard_signatures, shard, [record[0] for record in batch])
+        numchunks += len(batch)
+        batch = []
+        for file_name, chunk_ids in completed:
+            record_stored(manifest, file_name, chunk_ids, settings, keys[file_name])
+        save_manifest(manifest)
+        if profile:
+            for file_name, _ in completed:
+                store_profile(file_name)
+        completed = []
+
+    def results():
+        if workers <= 1:
+            for file_name in pending:
+                yield file_name, prepare_document(file_name, keys[file_name])
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(prepare_document, file_name, keys[file_name]): file_name for file_name in pending}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    print(f"Failed to process {futures[future]}: {e}")
+
+    for done, (file_name, records) in enumerate(results(), start=1):
+        shard = document_shard(file_name)
+        records, chunk_ids = suppress_near_duplicates(records, signatures.setdefault(shard, {}), manifest.get(file_name, {}).get("chunk_ids", []), shard)
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+        completed.append((file_name, chunk_ids))
+        elapsed = time.perf_counter() - start
+        print(f"[{done}/{len(pending)}] {file_name}: {len(records)} chunks "
+              f"({done/elapsed:.2f} files/s, {(numchunks+len(batch))/elapsed:.1f} chunks/s)")
+    flush()
 
+    elapsed = time.perf_counter() - start
+    print(f"Stored {numchunks} chunks from {len(pending)} files in {elapsed:.1f}s ({numchunks/elapsed:.1f} chunks/s)")
     return numchunks
 
-def query_content(query, N=5):
+def sync_folder(folder=DOCUMENT_FOLDER, workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE, profile=DOCUMENT_PROFILES):
+    """
+    Bring the collection in line with a folder: store new files, re-index changed ones,
+    and delete the chunks of files that were removed. Renamed files are not embedded again.
+    Returns the number of chunks stored.
+    """
+    manifest = load_manifest()
+    settings = ingest_settings()
+    file_names = list_documents(folder)
+    on_disk = set(file_names)
+    removed = [source for source in manifest if source.startswith(folder + "/") and source not in on_disk]
+
+    renamed = {manifest[source]["hash"]: source for source in removed
+               if manifest[source]["hash"] and manifest[source]["settings"] == settings}
+    for file_name in file_names:
+        if not renamed:
+            break
+        if file_name in manifest:
+            continue
+        content_hash = file_hash(file_name)
+        if content_hash not in renamed:
+            continue
+        shard = source_shard(manifest[renamed[content_hash]])
+        if shard != document_shard(file_name): # moved to another shard, it is stored again there
+            continue
+        old_name = renamed.pop(content_hash)
+        print(f"{old_name} was renamed to {file_name}, updating its chunks...")
+        entry = manifest.pop(old_name)
+        chunk_ids = entry["chunk_ids"]
+        for i in range(0, len(chunk_ids), EMBED_BATCH_SIZE):
+            # chunks shared with another document keep that document's name
+            ids = get_collection(shard).get(ids=chunk_ids[i:i+EMBED_BATCH_SIZE], where={"name": old_name}, include=[])["ids"]
+            if ids:
+                get_collection(shard).update(ids=ids, metadatas=[{"name": file_name}]*len(ids)) # only the name changes, no re-embedding
+        manifest[file_name] = make_entry(file_name, chunk_ids, settings, entry.get("tags", []), stored_at(entry), shard, entry.get("key"))
+        rename_profile(old_name, file_name)
+        bump_corpus_version()
+
+    for source in removed:
+        if source in manifest:
+            print(f"{source} was removed, deleting its chunks...")
+            delete_chunks(stale_chunk_ids(manifest, source), source_shard(manifest[source]))
+            reattribute_chunks(manifest, source, manifest[source]["chunk_ids"], source_shard(manifest[source]))
+            del manifest[source]
+            remove_profile(source)
+    save_manifest(manifest)
+
+    return store_many(file_names, workers=workers, batch_size=batch_size, profile=profile)
+
+def source_path(document_name:str) -> str:
+    """
+    Get the stored source path of a document, which is also its manifest key, given either its name in the documents
+    folder (paper.pdf, or project/paper.pdf) or that path (documents/paper.pdf). Names are never looked up in the
+    working directory. Raises ValueError for a name that points outside the documents folder.
+    """
+    name = os.path.normpath(document_name).replace(os.sep, "/") # ./documents/paper.pdf is documents/paper.pdf
+    file_name = name if name.startswith(DOCUMENT_FOLDER + "/") else f"{DOCUMENT_FOLDER}/{name}"
+    folder = os.path.realpath(DOCUMENT_FOLDER)
+    path = os.path.realpath(file_name)
+    if os.path.isabs(document_name) or path == folder or os.path.commonpath([folder, path]) != folder:
+        raise ValueError(f"{document_name} is not a document in the {DOCUMENT_FOLDER} folder.")
+    return file_name
+
+def remove_document(document_name:str, delete_file=False):
+    """
+    Delete exactly one document's chunks from the collection and forget it in the manifest.
+    The rest of the collection is untouched. Returns the number of chunks deleted.
+    """
+    file_name = source_path(document_name)
+    manifest = load_manifest()
+    if file_name not in manifest and not os.path.isfile(file_name):
+        raise ValueError(f"{document_name} is not stored.")
+    shard = source_shard(manifest[file_name]) if file_name in manifest else document_shard(file_name)
+    chunk_ids = set(get_collection(shard).get(where={"name": file_name}, include=[])["ids"])
+    chunk_ids.update(manifest.get(file_name, {"chunk_ids": []})["chunk_ids"])
+    shared = chunk_ids & shared_chunk_ids(manifest, file_name) # chunks in other documents too share an ID, keep them
+    chunk_ids -= shared
+    print(f"Removing {len(chunk_ids)} chunks of {file_name}...")
+    delete_chunks(list(chunk_ids), shard)
+    reattribute_chunks(manifest, file_name, shared, shard)
+    manifest.pop(file_name, None)
+    save_manifest(manifest)
+    remove_profile(file_name)
+    if delete_file and os.path.isfile(file_name):
+        os.remove(file_name)
+    return len(chunk_ids)
+
+def replace_document(document_name:str):
+    """
+    Re-index one document from its current file, replacing all of its chunks. Its tags and stored time are kept.
+    Returns the number of chunks stored.
+    """
+    file_name = source_path(document_name)
+    previous = load_manifest().get(file_name) # removing the document forgets its entry
+    remove_document(document_name)
+    return store_content(file_name, previous=previous)
+
+def document_catalog() -> list:
+    """
+    Get the profiles of all stored documents: page count, section outline, key terms and lead section.
+    Documents stored before profiles were enabled get theirs built now.
+    """
+    manifest = load_manifest()
+    catalog = load_catalog()
+    profiles = []
+    for file_name in sorted(manifest):
+        if file_name not in catalog and DOCUMENT_PROFILES and os.path.isfile(file_name):
+            store_profile(file_name)
+            catalog = load_catalog()
+        if file_name in catalog:
+            entry = manifest[file_name]
+            stored = datetime.fromtimestamp(stored_at(entry)).isoformat(timespec="seconds")
+            # what searches can filter on
+            profiles.append({**catalog[file_name], "tags": entry.get("tags", []), "stored_at": stored, "shard": source_shard(entry)})
+    return profiles
+
+def set_document_tags(document_name:str, tags) -> list:
+    """
+    Replace the tags of a stored document, which searches can filter on. Returns its tags.
+    """
+    file_name = source_path(document_name)
+    manifest = load_manifest()
+    if file_name not in manifest:
+        raise ValueError(f"{document_name} is not stored.")
+    manifest[file_name]["tags"] = sorted({tag.strip() for tag in tags if tag.strip()})
+    save_manifest(manifest)
+    bump_corpus_version() # cached results filtered by tags are out of date
+    return manifest[file_name]["tags"]
+
+def parse_time(value) -> float:
+    """
+    Get a timestamp from a timestamp or an ISO date, such as 2025-03-01 or 2025-03-01T12:00.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+FILTERS = {"sources", "pages", "tags", "stored_after", "stored_before", "shards"}
+
+def search_filters(sources=None, pages=None, tags=None, stored_after=None, stored_before=None, shards=None):
+    """
+    Build the filters of search_filter() from the arguments of the search tools, leaving out those not given.
+    """
+    filters = {"sources": sources, "pages": pages, "tags": tags, "stored_after": stored_after, "stored_before": stored_before, "shards": shards}
+    return {key: value for key, value in filters.items() if value not in (None, "", [])} or None
+
+def search_filter(filters):
+    """
+    Resolve search filters into a ChromaDB where clause, the set of chunk IDs they allow and the shards to search.
+    Returns (None, None, None) without filters.
+    filters is a dict with any of:
+        sources: document names or paths
+        pages: [first, last] page numbers, counted like the Page of search results
+        tags: documents with any of these tags
+        stored_after, stored_before: timestamps or ISO dates the documents were stored after or before
+        shards: names of shards, see list_shards()
+    Documents are picked from the manifest first, so only their shards and chunks are searched.
+    """
+    if not filters:
+        return None, None, None
+    unknown = set(filters) - FILTERS
+    if unknown:
+        raise ValueError(f"Unknown search filters {', '.join(sorted(unknown))}, use {', '.join(sorted(FILTERS))}.")
+    manifest = load_manifest()
+    sources = set(manifest)
+    if filters.get("shards"):
+        shards = set(filters["shards"])
+        sources = {source for source in sources if source_shard(manifest[source]) in shards}
+    if filters.get("sources"):
+        sources &= {source_path(name) for name in filters["sources"]}
+    if filters.get("tags"):
+        tags = set(filters["tags"])
+        sources = {source for source in sources if tags & set(manifest[source].get("tags", []))}
+    if filters.get("stored_after"):
+        after = parse_time(filters["stored_after"])
+        sources = {source for source in sources if stored_at(manifest[source]) >= after}
+    if filters.get("stored_before"):
+        before = parse_time(filters["stored_before"])
+        sources = {source for source in sources if stored_at(manifest[source]) < before}
+
+    shards = sorted({source_shard(manifest[source]) for source in sources})
+    conditions = []
+    if sources != {source for source in manifest if source_shard(manifest[source]) in shards}: # not just whole shards
+        conditions.append({"name": {"$in": sorted(sources)}})
+    chunk_ids = set()
+    if filters.get("pages"):
+        first, last = [int(page) for page in (list(filters["pages"]) * 2)[:2]] # a single page is [page]
+        conditions += [{"page_number": {"$gte": first}}, {"page_number": {"$lte": last}}]
+        for source in sources:
+            if source.endswith(".pdf"): # text files have no pages
+                chunk_ids.update(chunk_id for chunk_id in manifest[source]["chunk_ids"]
+                                 if (position := parse_chunk_id(chunk_id)) and first <= position[1] <= last)
+    else:
+        for source in sources:
+            chunk_ids.update(manifest[source]["chunk_ids"])
+    if sources == set(manifest) and not conditions:
+        return None, None, None
+    where = {"$and": conditions} if len(conditions) > 1 else conditions[0] if conditions else None
+    return where, chunk_ids, shards
+
+def query_content(query, N=5, mode=SEARCH_MODE, rerank=RERANK, filters=None):
     """
     Query the content of a paper in ChromaDB, returns the top N most relevant chunks from the documents.
+    mode is vector (semantic similarity), lexical (BM25 keyword match) or hybrid (both, fused by rank).
+    If rerank is set, more candidates are fetched and rescored with a cross-encoder, see rerank.py.
+    filters limits the search to some documents or pages, see search_filter().
+    Results are cached until the corpus changes, see query_cache.stats() for hit/miss counters.
+    """
+    return query_content_many([query], N, mode=mode, rerank=rerank, filters=filters)[0]["Results"]
+
+def query_content_many(queries, N=5, deduplicate=False, mode=SEARCH_MODE, rerank=RERANK, filters=None):
+    """
+    Query several questions at once. All uncached queries are embedded in one batch and searched in one call.
+    Returns a list with one {"Query", "Results"} entry per query, in order.
+    If deduplicate is set, a chunk already returned for an earlier query is left out of later ones.
+    filters applies to every query, see search_filter().
+    """
+    version = corpus_version()
+    filter_key = json.dumps(filters, sort_keys=True) if filters else None
+    keys = [(normalise_query(query), N, mode, rerank, filter_key) for query in queries]
+    results = [query_cache.get(key, version) for key in keys]
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    if missing:
+        candidates = max(N, RERANK_CANDIDATES) if rerank else N
+        for i, results_list in zip(missing, search_queries([queries[i] for i in missing], candidates, mode, filters)):
+            complete = True
+            if rerank:
+                results_list, complete = reranker.rerank(queries[i], results_list, N)
+            if complete: # don't cache results that ran out of rerank budget, they may be reranked next time
+                query_cache.put(keys[i], version, results_list)
+            results[i] = results_list
+
+    grouped = []
+    seen = set()
+    for query, results_list in zip(queries, results):
+        results_list = [dict(result) for result in results_list]
+        if deduplicate:
+            results_list = [result for result in results_list if result["Id"] not in seen]
+            seen.update(result["Id"] for result in results_list)
+        grouped.append({"Query": query, "Results": results_list})
+    return grouped
+
+def make_result(chunk_id, document, metadata, distance):
+    return {
+        "Id" : chunk_id,
+        "Source" : metadata['name'],
+        "Page" : metadata.get('page_number', 'N/A'),
+        "Chunk" : metadata['chunk_number'],
+        "Distance" : distance,
+        "Content" : document
+    }
+
+def embed_queries(queries):
+    """
+    Embed a list of queries in one batch. Returns plain lists, so they can be sent by the document service.
     """
-    results = collection.query(
-        query_texts=[query],
-        n_results=N
-    )
-    results_list = []
-    for document, distance, metadata in zip(results['documents'][0], results['distances'][0], results['metadatas'][0]):
-        results_list.append(
-            {
-                "Source" : metadata['name'],
-                "Page" : metadata.get('page_number', 'N/A'),
-                "Chunk" : metadata['chunk_number'],
-                "Distance" : distance,
-                "Content" : document
-            }
+    return [list(map(float, embedding)) for embedding in get_embedding_function()(list(queries))]
+
+def search_queries(queries, N=5, mode=SEARCH_MODE, filters=None):
+    """
+    Search without the result cache. Returns a list of results lists, one per query.
+    """
+    queries = list(queries)
+    where, chunk_ids, shards = search_filter(filters)
+    if chunk_ids is not None and not chunk_ids: # no document matches the filters
+        return [[] for _ in queries]
+    query_embeddings = get_embedding_function()(queries) # one batch for all queries
+    if mode == "vector":
+        return search_collection(query_embeddings, N, where, shards)
+    if mode == "lexical":
+        return [fetch_results([chunk_id for chunk_id, _ in get_lexical_index().search(query, N, chunk_ids)], embedding, shards)
+                for query, embedding in zip(queries, query_embeddings)]
+    if mode == "hybrid":
+        candidates = max(N, HYBRID_CANDIDATES)
+        all_results = []
+        for query, embedding, vector_results in zip(queries, query_embeddings, search_collection(query_embeddings, candidates, where, shards)):
+            lexical_ids = [chunk_id for chunk_id, _ in get_lexical_index().search(query, candidates, chunk_ids)]
+            top = reciprocal_rank_fusion([[result["Id"] for result in vector_results], lexical_ids])[:N]
+            by_id = {result["Id"]: result for result in vector_results}
+            by_id.update({result["Id"]: result for result in fetch_results([i for i in top if i not in by_id], embedding, shards)})
+            all_results.append([by_id[i] for i in top if i in by_id])
+        return all_results
+    raise ValueError(f"Unknown search mode {mode}, use vector, lexical or hybrid.")
+
+def search_collection(query_embeddings, N=5, where=None, shards=None):
+    """
+    Vector search in ChromaDB for a list of query embeddings, optionally only in chunks matching a where clause.
+    Every shard (or only the given ones) is searched in parallel for its top N, and the N closest of those are kept.
+    Returns a list of results lists, one per query.
+    """
+    query_embeddings = list(query_embeddings)
+
+    def search(shard):
+        results = get_collection(shard).query(
+            query_embeddings=query_embeddings,
+            n_results=N,
+            **({"where": where} if where else {}),
         )
-    return results_list
+        all_results = []
+        for ids, documents, distances, metadatas in zip(results['ids'], results['documents'], results['distances'], results['metadatas']):
+            all_results.append([
+                make_result(chunk_id, document, metadata, distance)
+                for chunk_id, document, distance, metadata in zip(ids, documents, distances, metadatas)
+            ])
+        return all_results
+
+    # each query's results from every shard, merged by distance
+    return [sorted(chain(*shard_results), key=lambda result: result["Distance"])[:N] for shard_results in zip(*map_shards(search, shards))]
+
+def get_chunks(chunk_ids, include, shards=None) -> dict:
+    """
+    Get chunks by ID from whichever shards hold them, like a ChromaDB get. Chunks not stored are left out.
+    """
+    fields = ["ids", *include]
+    chunks = {field: [] for field in fields}
+    for part in map_shards(lambda shard: get_collection(shard).get(ids=list(chunk_ids), include=include), shards):
+        for field in fields:
+            chunks[field].extend(part[field])
+    return chunks
+
+def fetch_results(chunk_ids, query_embedding, shards=None):
+    """
+    Get results for specific chunks, in the given order, with their distance to the query embedding.
+    Used for chunks found by lexical search, which has no distance of its own.
+    """
+    if not chunk_ids:
+        return []
+    chunks = get_chunks(chunk_ids, ["documents", "metadatas", "embeddings"], shards)
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    by_id = {}
+    for chunk_id, document, metadata, embedding in zip(chunks['ids'], chunks['documents'], chunks['metadatas'], chunks['embeddings']):
+        distance = float(np.sum((np.asarray(embedding, dtype=np.float32) - query_embedding) ** 2)) # squared L2, same as ChromaDB
+        by_id[chunk_id] = make_result(chunk_id, document, metadata, distance)
+    return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+def neighbour_ids(hit_id, metadata, before=1, after=1) -> list:
+    """
+    Get the IDs of the chunks around a chunk, in document order, including the chunk itself.
+    Computed from its positional ID, reaching into the previous and next page but not further.
+    """
+    key, page_number, ordinal = parse_chunk_id(hit_id)
+    page_chunks = metadata.get("page_chunks", ordinal + 1)
+    previous_page_chunks = metadata.get("previous_page_chunks", 0)
+    ids = []
+    for i in range(ordinal - before, ordinal + after + 1):
+        if i < 0:
+            if page_number > 0 and previous_page_chunks + i >= 0:
+                ids.append(chunk_id(key, page_number - 1, previous_page_chunks + i))
+        elif i >= page_chunks:
+            ids.append(chunk_id(key, page_number + 1, i - page_chunks)) # missing if there is no next page, and skipped
+        else:
+            ids.append(chunk_id(key, page_number, i))
+    return ids
+
+def merge_chunks(chunks) -> str:
+    """
+    Join consecutive (document, metadata) chunks into one text, using their offsets to leave out the overlap.
+    """
+    parts = []
+    previous = None
+    for document, metadata in chunks:
+        start = metadata.get("start_char", -1)
+        if previous and previous.get("page_number") == metadata.get("page_number") and start != -1 and previous["end_char"] != -1:
+            if start < previous["end_char"]:
+                document = document[previous["end_char"] - start:]
+            parts.append(document if start < previous["end_char"] else "\n" + document)
+        else:
+            parts.append(("\n\n" if parts else "") + document)
+        previous = metadata
+    return "".join(parts)
+
+def expand_hit(hit, before=1, after=1):
+    """
+    Widen a search result with the chunks before and after it, looked up by ID.
+    hit is a result from query_content, or its Id. Returns the Source, the Pages covered, the chunk Ids in order
+    and their merged Content, or None if the chunk is no longer stored.
+    """
+    hit_id = hit["Id"] if isinstance(hit, dict) else hit
+    chunk = get_chunks([hit_id], ["metadatas"])
+    if not chunk["ids"]:
+        return None
+    metadata = chunk["metadatas"][0]
+    ids = neighbour_ids(hit_id, metadata, before, after) if parse_chunk_id(hit_id) else [hit_id] # content hash IDs have no neighbours
+    chunks = get_chunks(ids, ["documents", "metadatas"])
+    by_id = {chunk_id: (document, metadata) for chunk_id, document, metadata in zip(chunks["ids"], chunks["documents"], chunks["metadatas"])}
+    ids = [chunk_id for chunk_id in ids if chunk_id in by_id]
+    return {
+        "Id": hit_id,
+        "Source": metadata["name"],
+        "Pages": list(dict.fromkeys(by_id[chunk_id][1].get("page_number", "N/A") for chunk_id in ids)),
+        "Chunks": ids,
+        "Content": merge_chunks([by_id[chunk_id] for chunk_id in ids]),
+    }
 
 def print_query_results(query_results):
     """
@@ -106,14 +887,139 @@ def print_query_results(query_results):
     
 def delete_all_vectors():
     print("Deleting all stored vectors and resetting collection...")
-    if os.path.exists('vectordata/stored'):
-        os.remove('vectordata/stored')
-    global collection
-    client.delete_collection(name="contents")
-    collection = client.get_or_create_collection(name="contents")
+    shards = stored_shards() # detached shards are left alone
+    delete_manifest()
+    delete_catalog()
+    for shard in {MAIN_SHARD, *shards}:
+        reset_collection(shard)
+        get_near_duplicate_index(shard).clear()
+    get_lexical_index().clear()
+    bump_corpus_version()
+
+#---------- shards ----------
+
+def shard_sources(manifest, shard) -> list:
+    return sorted(source for source, entry in manifest.items() if source_shard(entry) == shard)
+
+def list_shards() -> list:
+    """
+    List the shards with their directory, number of documents and chunks, and whether they are detached.
+    """
+    manifest = load_manifest()
+    shards = []
+    for shard in sorted({source_shard(entry) for entry in manifest.values()}):
+        sources = shard_sources(manifest, shard)
+        shards.append({"shard": shard, "path": shard_path(shard), "documents": len(sources),
+                       "chunks": sum(len(manifest[source]["chunk_ids"]) for source in sources), "detached": False})
+    for shard in detached_shards():
+        sources = load_shard_record(shard)["sources"]
+        shards.append({"shard": shard, "path": shard_path(shard), "documents": len(sources),
+                       "chunks": sum(len(entry["chunk_ids"]) for entry in sources.values()), "detached": True})
+    return shards
+
+def rebuild_shard(shard, workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE, profile=DOCUMENT_PROFILES):
+    """
+    Rebuild one shard from its documents' files, leaving every other shard untouched.
+    Its collection and near-duplicate index are dropped and its documents stored again, from the embedding cache
+    where possible. Documents whose file is gone are removed. Returns the number of chunks stored.
+    """
+    if is_detached(shard):
+        raise ValueError(f"Shard {shard} is detached, attach it first.")
+    manifest = load_manifest()
+    sources = shard_sources(manifest, shard)
+    print(f"Rebuilding shard {shard} from {len(sources)} documents...")
+    reset_collection(shard)
+    get_near_duplicate_index(shard).clear()
+    get_lexical_index().remove([chunk_id for source in sources for chunk_id in manifest[source]["chunk_ids"]])
+    for source in sources:
+        if os.path.isfile(source):
+            manifest[source].update(chunk_ids=[], settings=None) # stored again below, keeping its tags
+        else:
+            del manifest[source]
+            remove_profile(source)
+    save_manifest(manifest)
+    bump_corpus_version()
+    return store_many([source for source in sources if source in manifest], workers=workers, batch_size=batch_size, profile=profile)
+
+def backup_shard(shard, path):
+    """
+    Copy a shard to a new directory: its chunks with their embeddings, its near-duplicate index, and a shard.json with its
+    documents' manifest entries and profiles. To restore it, copy the directory to vectordata/shards/<name> and
+    call attach_shard(name). Returns the number of chunks copied.
+    """
+    manifest = load_manifest()
+    sources = shard_sources(manifest, shard)
+    if not sources and shard != MAIN_SHARD:
+        raise ValueError(f"Shard {shard} has no stored documents." + (" It is detached, copy its directory instead." if is_detached(shard) else ""))
+    if os.path.exists(path) and os.listdir(path):
+        raise ValueError(f"{path} is not empty.")
+    target = make_client(path).get_or_create_collection(name="contents", metadata={"embedding_model": get_embedding_function().key})
+    copied = 0
+    while True:
+        page = get_collection(shard).get(include=["documents", "metadatas", "embeddings"], limit=EMBED_BATCH_SIZE, offset=copied)
+        if not page["ids"]:
+            break
+        target.add(ids=page["ids"], documents=page["documents"], metadatas=page["metadatas"], embeddings=page["embeddings"])
+        copied += len(page["ids"])
+    if NEAR_DUPLICATE_THRESHOLD or shard in _near_duplicate_indexes:
+        get_near_duplicate_index(shard).backup(f"{path}/near_duplicates.sqlite3")
+    catalog = load_catalog()
+    save_shard_record(path, shard, {source: manifest[source] for source in sources},
+                      {source: catalog[source] for source in sources if source in catalog})
+    print(f"Backed up {copied} chunks of shard {shard} to {path}")
+    return copied
+
+def detach_shard(shard):
+    """
+    Take a shard out of the index. Its directory is left as it is, with a shard.json holding its documents'
+    manifest entries and profiles, so it can be archived or moved once no process has it open, or attached again.
+    Its documents are no longer searched or stored. Returns the number of documents detached.
+    """
+    if shard == MAIN_SHARD:
+        raise ValueError(f"The main shard lives in {MAIN_SHARD_PATH} with the rest of the index and can't be detached.")
+    manifest = load_manifest()
+    sources = shard_sources(manifest, shard)
+    if not sources:
+        raise ValueError(f"Shard {shard} has no stored documents.")
+    catalog = load_catalog()
+    save_shard_record(shard_path(shard), shard, {source: manifest[source] for source in sources},
+                      {source: catalog[source] for source in sources if source in catalog})
+    get_lexical_index().remove([chunk_id for source in sources for chunk_id in manifest[source]["chunk_ids"]])
+    for source in sources:
+        del manifest[source]
+        remove_profile(source)
+    save_manifest(manifest)
+    with _load_lock:
+        _collections.pop(shard, None)
+        _near_duplicate_indexes.pop(shard, None)
+    bump_corpus_version()
+    print(f"Detached shard {shard} with {len(sources)} documents")
+    return len(sources)
+
+def attach_shard(shard):
+    """
+    Attach a detached shard, or a backup copied to vectordata/shards/<shard>, so its documents are searched again.
+    Its chunks are not embedded again, only added to the lexical index. Returns the number of documents attached.
+    """
+    record = load_shard_record(shard)
+    manifest = load_manifest()
+    clashes = set(record["sources"]) & set(manifest)
+    if clashes:
+        raise ValueError(f"Documents of shard {shard} are already stored in another shard: {', '.join(sorted(clashes))}")
+    manifest.update({source: {**entry, "shard": shard} for source, entry in record["sources"].items()})
+    save_manifest(manifest)
+    for source, profile in record["catalog"].items():
+        set_profile(source, profile)
+    _fill_lexical_index(get_lexical_index(), [shard])
+    delete_shard_record(shard)
+    bump_corpus_version()
+    print(f"Attached shard {shard} with {len(record['sources'])} documents")
+    return len(record["sources"])
 
 # run this file to vectorize and store the document
 if __name__ == "__main__":
+    if WARMUP:
+        warm_up()
     while True:
         instructions = "Query (q), Store (s), Clear (c), Exit (e): "
         inp = input(instructions).lower()
@@ -121,8 +1027,7 @@ if __name__ == "__main__":
             query = input("Enter your query: ")
             print_query_results(query_content(query))
         elif inp == "s":
-            for document_name in os.listdir(DOCUMENT_FOLDER):
-                store_content(f"{DOCUMENT_FOLDER}/{document_name}")
+            sync_folder(DOCUMENT_FOLDER)
         elif inp == "c":
             delete_all_vectors()
         elif inp == "e":